@@ -0,0 +1,111 @@
+"""Bitboard helpers used by game.Game
+squares are numbered 0-63 from a1 along each rank, so a1 = 0, h1 = 7, a8 = 56 and h8 = 63
+a square's bit is 1 << square, and its indices in the old list board are divmod(square, 8)"""
+from utils_and_constants import square_to_pos
+
+FULL = 0xFFFFFFFFFFFFFFFF
+FILE_A = 0x0101010101010101
+FILE_B = FILE_A << 1
+FILE_G = FILE_A << 6
+FILE_H = FILE_A << 7
+NOT_FILE_A = FULL ^ FILE_A
+NOT_FILE_H = FULL ^ FILE_H
+NOT_FILE_AB = FULL ^ (FILE_A | FILE_B)
+NOT_FILE_GH = FULL ^ (FILE_G | FILE_H)
+RANK_1 = 0xFF
+RANK_2 = RANK_1 << 8
+RANK_3 = RANK_1 << 16
+RANK_6 = RANK_1 << 40
+RANK_7 = RANK_1 << 48
+RANK_8 = RANK_1 << 56
+
+A1, H1, A8, H8 = 0, 7, 56, 63
+
+SQUARE_TO_POS: list[tuple[int, int]] = [square_to_pos(square) for square in range(64)]
+
+# directions are indexes into DIRECTION_SHIFTS and RAYS, the first four go up the board (towards higher squares)
+NORTH, EAST, NORTH_EAST, NORTH_WEST, SOUTH, WEST, SOUTH_WEST, SOUTH_EAST = range(8)
+ROOK_DIRECTIONS = (NORTH, EAST, SOUTH, WEST)
+BISHOP_DIRECTIONS = (NORTH_EAST, NORTH_WEST, SOUTH_WEST, SOUTH_EAST)
+# (shift, mask) pairs, the mask removes bits that wrapped around to the other side of the board
+DIRECTION_SHIFTS = [(8, FULL), (1, NOT_FILE_A), (9, NOT_FILE_A), (7, NOT_FILE_H), (-8, FULL), (-1, NOT_FILE_H), (-9, NOT_FILE_H), (-7, NOT_FILE_A)]
+
+
+def squares_of(bb: int) -> list[int]:
+    """return the square numbers of every set bit, lowest first"""
+    squares = []
+    while bb:
+        lsb = bb & -bb
+        squares.append(lsb.bit_length() - 1)
+        bb ^= lsb
+    return squares
+
+
+def knight_attacks(bb: int) -> int:
+    """squares attacked by every knight in bb at once"""
+    one_west = (bb >> 1) & NOT_FILE_H
+    two_west = (bb >> 2) & NOT_FILE_GH
+    one_east = (bb << 1) & NOT_FILE_A
+    two_east = (bb << 2) & NOT_FILE_AB
+    one_file = one_west | one_east
+    two_files = two_west | two_east
+    return ((one_file << 16) | (one_file >> 16) | (two_files << 8) | (two_files >> 8)) & FULL
+
+
+def king_attacks(bb: int) -> int:
+    sideways = ((bb << 1) & NOT_FILE_A) | ((bb >> 1) & NOT_FILE_H)
+    row = bb | sideways
+    return (sideways | (row << 8) | (row >> 8)) & FULL
+
+
+def pawn_attacks(bb: int, white: bool) -> int:
+    if white:
+        return (((bb << 9) & NOT_FILE_A) | ((bb << 7) & NOT_FILE_H)) & FULL
+    return ((bb >> 7) & NOT_FILE_A) | ((bb >> 9) & NOT_FILE_H)
+
+
+def ray_squares(square: int, direction: int) -> list[int]:
+    """squares from square to the edge of the board in direction, nearest first"""
+    amount, mask = DIRECTION_SHIFTS[direction]
+    squares = []
+    current = 1 << square
+    while True:
+        current = (current << amount if amount > 0 else current >> -amount) & mask & FULL
+        if not current:
+            return squares
+        squares.append(current.bit_length() - 1)
+
+
+# lookup tables, built once here so move generation never has to work destinations out
+KNIGHT_ATTACKS: list[int] = [knight_attacks(1 << square) for square in range(64)]
+KING_ATTACKS: list[int] = [king_attacks(1 << square) for square in range(64)]
+PAWN_ATTACKS: list[list[int]] = [[pawn_attacks(1 << square, white) for square in range(64)] for white in (False, True)]  # indexed by white then square
+RAY_SQUARES: list[list[list[int]]] = [[ray_squares(square, direction) for square in range(64)] for direction in range(8)]  # indexed by direction then square
+RAYS: list[list[int]] = [[sum(1 << ray_square for ray_square in ray) for ray in rays] for rays in RAY_SQUARES]
+
+
+def ray_attacks(square: int, occupied: int, direction: int) -> int:
+    """squares attacked from square in one direction, stopping at (and including) the first occupied square"""
+    attacks = RAYS[direction][square]
+    blockers = attacks & occupied
+    if blockers:
+        if direction < 4:  # rays going up the board hit their lowest blocker first
+            blocker = (blockers & -blockers).bit_length() - 1
+        else:
+            blocker = blockers.bit_length() - 1
+        attacks ^= RAYS[direction][blocker]
+    return attacks
+
+
+def bishop_attacks(square: int, occupied: int) -> int:
+    return (ray_attacks(square, occupied, NORTH_EAST) | ray_attacks(square, occupied, NORTH_WEST)
+            | ray_attacks(square, occupied, SOUTH_WEST) | ray_attacks(square, occupied, SOUTH_EAST))
+
+
+def rook_attacks(square: int, occupied: int) -> int:
+    return (ray_attacks(square, occupied, NORTH) | ray_attacks(square, occupied, EAST)
+            | ray_attacks(square, occupied, SOUTH) | ray_attacks(square, occupied, WEST))
+
+
+def queen_attacks(square: int, occupied: int) -> int:
+    return bishop_attacks(square, occupied) | rook_attacks(square, occupied)
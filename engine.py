@@ -1,223 +1,455 @@
-from game import Game
+from game import Game, State
 import piece
 import json
 import time
 import random
-from functools import lru_cache
 import threading
+import queue
+import atexit
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from evaluation_tables import piece_values, TOTAL_PHASE
+from search_statistics import SearchStatistics, COUNTER_NAMES, log_statistics, logger
+from transposition_table import TranspositionTable, SharedTranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
 from utils_and_constants import *
 
 with open("openings/opening_values_d3.json", "r") as f:
     OPENING_VALUES: dict[str, int] = json.load(f)
 
 OPENING_VARIATION = 1.05  # values below 1.05 are too random and above 1.1 are too consistant
-nodes_counted = 0
-
-piece_values = {
-    piece.PAWN: 100,
-    piece.KNIGHT: 320,
-    piece.BISHOP: 330,
-    piece.ROOK: 500,
-    piece.QUEEN: 900,
-    piece.KING: 20000
-}
-piece_square_tables = {
-    piece.PAWN: [
-        [0, 0, 0, 0, 0, 0, 0, 0],
-        [50, 50, 50, 50, 50, 50, 50, 50],
-        [10, 10, 20, 30, 30, 20, 10, 10],
-        [5, 5, 10, 25, 25, 10, 5, 5],
-        [0, 0, 0, 20, 20, 0, 0, 0],
-        [5, -5, -10, 0, 0, -10, -5, 5],
-        [5, 10, 10, -20, -20, 10, 10, 5],
-        [0, 0, 0, 0, 0, 0, 0, 0]
-    ],
-    piece.KNIGHT: [
-        [-50, -40, -30, -30, -30, -30, -40, -50],
-        [-40, -20, 0, 0, 0, 0, -20, -40],
-        [-30, 0, 10, 15, 15, 10, 0, -30],
-        [-30, 5, 15, 20, 20, 15, 5, -30],
-        [-30, 0, 15, 20, 20, 15, 0, -30],
-        [-30, 5, 10, 15, 15, 10, 5, -30],
-        [-40, -20, 0, 5, 5, 0, -20, -40],
-        [-50, -40, -30, -30, -30, -30, -40, -50]
-    ],
-    piece.BISHOP: [
-        [-20, -10, -10, -10, -10, -10, -10, -20],
-        [-10, 0, 0, 0, 0, 0, 0, -10],
-        [-10, 0, 5, 10, 10, 5, 0, -10],
-        [-10, 5, 5, 10, 10, 5, 5, -10],
-        [-10, 0, 10, 10, 10, 10, 0, -10],
-        [-10, 10, 10, 10, 10, 10, 10, -10],
-        [-10, 5, 0, 0, 0, 0, 5, -10],
-        [-20, -10, -10, -10, -10, -10, -10, -20]
-    ],
-    piece.ROOK: [
-        [0, 0, 0, 0, 0, 0, 0, 0],
-        [5, 10, 10, 10, 10, 10, 10, 5],
-        [-5, 0, 0, 0, 0, 0, 0, -5],
-        [-5, 0, 0, 0, 0, 0, 0, -5],
-        [-5, 0, 0, 0, 0, 0, 0, -5],
-        [-5, 0, 0, 0, 0, 0, 0, -5],
-        [-5, 0, 0, 0, 0, 0, 0, -5],
-        [0, 0, 0, 5, 5, 0, 0, 0]
-    ],
-    piece.QUEEN: [
-        [-20, -10, -10, -5, -5, -10, -10, -20],
-        [-10, 0, 0, 0, 0, 0, 0, -10],
-        [-10, 0, 5, 5, 5, 5, 0, -10],
-        [-5, 0, 5, 5, 5, 5, 0, -5],
-        [0, 0, 5, 5, 5, 5, 0, -5],
-        [-10, 5, 5, 5, 5, 5, 0, -10],
-        [-10, 0, 5, 0, 0, 0, 0, -10],
-        [-20, -10, -10, -5, -5, -10, -10, -20]
-    ],
-    piece.KING: [
-        [-30, -40, -40, -50, -50, -40, -40, -30],
-        [-30, -40, -40, -50, -50, -40, -40, -30],
-        [-30, -40, -40, -50, -50, -40, -40, -30],
-        [-30, -40, -40, -50, -50, -40, -40, -30],
-        [-20, -30, -30, -40, -40, -30, -30, -20],
-        [-10, -20, -20, -20, -20, -20, -20, -10],
-        [20, 20, 0, 0, 0, 0, 20, 20],
-        [20, 30, 10, 0, 0, 10, 30, 20]
-    ]
-}
-EARLY_GAME_KING = [
-    [-30, -40, -40, -50, -50, -40, -40, -30],
-    [-30, -40, -40, -50, -50, -40, -40, -30],
-    [-30, -40, -40, -50, -50, -40, -40, -30],
-    [-30, -40, -40, -50, -50, -40, -40, -30],
-    [-20, -30, -30, -40, -40, -30, -30, -20],
-    [-10, -20, -20, -20, -20, -20, -20, -10],
-    [20, 20, 0, 0, 0, 0, 20, 20],
-    [20, 60, 90, 0, 0, 10, 110, 20]
-]
-LATE_GAME_KING = [
-    [-50, -40, -30, -20, -20, -30, -40, -50],
-    [-30, -20, -10, 0, 0, -10, -20, -30],
-    [-30, -10, 20, 30, 30, 20, -10, -30],
-    [-30, -10, 30, 40, 40, 30, -10, -30],
-    [-30, -10, 30, 40, 40, 30, -10, -30],
-    [-30, -10, 20, 30, 30, 20, -10, -30],
-    [-30, -30, 0, 0, 0, 0, -30, -30],
-    [-50, -30, -30, -30, -30, -30, -30, -50]
-]
-
-def get_piece_value(piece_type: int, piece_colour: bool, i: int, j: int):
-    value = piece_values[piece_type]
-    if not piece_colour:
-        value += piece_square_tables[piece_type][i][j]
-        return -value
-    else:
-        value += piece_square_tables[piece_type][7 - i][j]
-        return value
-
-@lru_cache(maxsize=65536)
-def base_evaluation(game: Game, depth: int):
-    global nodes_counted
-    nodes_counted += 1
-    evaluation = 0
-    castle_wk, castle_wq, castle_bk, castle_bq = game.get_castling_rights()
-    evaluation += 40*(castle_wk + castle_wq - castle_bk - castle_bq)
-    w_pawn_count = 0
-    b_pawn_count = 0
-    piece_count = 0
-    for i, rank in enumerate(game.get_board()):
-        for j, item in enumerate(rank):
-            if item is not None:
-                piece_type, piece_colour = piece.get_piece_attrs(item)
-                if piece_type == piece.PAWN:
-                    if piece_colour:
-                        w_pawn_count += 1
-                    else:
-                        b_pawn_count += 1
-                if piece_type == piece.KING:
-                    if piece_colour:
-                        w_king_tuple = (piece_type, piece_colour, i, j)
-                    else:
-                        b_king_tuple = (piece_type, piece_colour, i, j)
-                else:
-                    evaluation += get_piece_value(piece_type, piece_colour, i, j)
-                    piece_count += 1
+MATE_SCORE = 1000000
+MATE_THRESHOLD = MATE_SCORE // 2  # anything further from 0 than this is a mate score
+INFINITE_SCORE = int(1e10)  # bounds the full window, beyond any real score
+ASPIRATION_WINDOW = 50  # each iteration first searches this far either side of the last one's score
+TRANSPOSITION_TABLE_MEGABYTES = 32
+MAX_SEARCH_DEPTH = 64
+LIMIT_CHECK_INTERVAL = 1024  # nodes between checking the clock, a power of two
+QUIESCENCE_MAX_DEPTH = 8  # plies of captures searched past the horizon before just using the evaluation
+DELTA_MARGIN = 200  # captures that can't get within this of alpha even winning the piece outright aren't searched
+NULL_MOVE_PRUNING = True  # the defaults for SearchContext's switches, turn them off there to measure what each is worth
+LATE_MOVE_REDUCTIONS = True
+FUTILITY_PRUNING = True
+NULL_MOVE_REDUCTION = 2  # plies less the search after passing gets
+LMR_MIN_DEPTH = 3
+LMR_MIN_MOVES = 3  # moves searched at full depth before the rest are reduced
+FUTILITY_MARGINS = (0, 200, 500)  # by depth left, depths past the end aren't pruned
+WHITE_PAWN = piece.generate_piece(piece.PAWN, True)
+BLACK_PAWN = piece.generate_piece(piece.PAWN, False)
+NON_PAWN_PIECES = [[piece.generate_piece(piece_type, white) for piece_type in (piece.KNIGHT, piece.BISHOP, piece.ROOK, piece.QUEEN)]
+                   for white in (False, True)]
+# 40 for each castling right white has left, minus 40 for each of black's, indexed by game.castling
+CASTLING_RIGHTS_SCORES = [40 * ((castling & 1) + (castling >> 1 & 1) - (castling >> 2 & 1) - (castling >> 3 & 1)) for castling in range(16)]
+transposition_table: TranspositionTable | SharedTranspositionTable = TranspositionTable(TRANSPOSITION_TABLE_MEGABYTES)  # kept between searches, see new_search
+search_helpers: 'SearchHelpers | None' = None  # lazy smp helper processes, see set_search_threads
+MAX_SEARCH_THREADS = 64
+# the table and helpers are only swapped out once no search is using them, see searching
+search_threads_condition = threading.Condition()
+searches_running = 0
+root_move_pool: ProcessPoolExecutor | None = None  # kept warm between root split searches, see get_root_move_pool
+root_move_pool_processes = 0
+
+def evaluate(game: Game, depth: int) -> int:
+    """white positive evaluation, O(1) since game keeps its material and piece square scores up to date
+    the king tables are tapered between the early and late game ones by how much material is left"""
+    if game.king_squares[True] is None:
+        return -MATE_SCORE - depth
+    if game.king_squares[False] is None:
+        return MATE_SCORE + depth
+    phase = min(game.phase, TOTAL_PHASE)
+    evaluation = (game.opening_score * phase + game.endgame_score * (TOTAL_PHASE - phase)) // TOTAL_PHASE
+    evaluation += CASTLING_RIGHTS_SCORES[game.castling]
+    w_pawn_count = game.piece_counts[WHITE_PAWN]
+    b_pawn_count = game.piece_counts[BLACK_PAWN]
     evaluation += 5*(w_pawn_count**2 - b_pawn_count**2)
-    if piece_count <= 12:
-        piece_square_tables[piece.KING] = LATE_GAME_KING
-    else:
-        piece_square_tables[piece.KING] = EARLY_GAME_KING
-    try:
-        evaluation += get_piece_value(*w_king_tuple) # type: ignore
-    except UnboundLocalError:
-        return -1000000 - depth
-    try:
-        evaluation += get_piece_value(*b_king_tuple) # type: ignore
-    except UnboundLocalError:
-        return 1000000 + depth
     return evaluation
 
-def move_ordering_key(move: tuple[tuple[int, int], tuple[int, int]], game: Game) -> int:
-    start, end = move
-    start_piece = game.get_piece_from_pos(start)
-    assert start_piece is not None
-    end_piece = game.get_piece_from_pos(end)
-    if end_piece is not None:
-        return piece_values[piece.get_piece_type(end_piece)] - piece_values[piece.get_piece_type(start_piece)]
+# most valuable victim, least valuable attacker: [victim type][attacker type], any capture beats any quiet move
+MVV_LVA = [[0] * 8 for _ in range(8)]
+for victim_type in piece_values:
+    for attacker_type in piece_values:
+        MVV_LVA[victim_type][attacker_type] = 10 * min(piece_values[victim_type], piece_values[piece.QUEEN]) - piece_values[attacker_type] // 100
+# winning captures are ordered above promotions that don't capture
+CAPTURE_SCORE = 1 << 24
+PROMOTION_SCORE = 1 << 23
+HISTORY_LIMIT = 1 << 20  # history scores are halved when one gets this big
+
+def mvv_lva_score(move: int, game: Game) -> int:
+    attacker_type = game.squares[move_start_square(move)] & 7  # type: ignore (moves start on a piece)
+    if move & MOVE_EN_PASSANT:
+        return MVV_LVA[piece.PAWN][piece.PAWN]
+    return MVV_LVA[game.squares[move_end_square(move)] & 7][attacker_type]  # type: ignore (captures land on a piece)
+
+def is_tactical(move: int) -> bool:
+    return bool(move & MOVE_CAPTURE or move & MOVE_PROMOTION_MASK)
+
+def pick_moves(game: Game, context: 'SearchContext', ply: int, hash_move: int | None, previous_move: int | None):
+    """staged move picker, yields the hash move, winning captures and promotions by mvv-lva, killers, the counter move,
+    quiet moves by history and finally losing captures. each stage is only generated once the one before is used up,
+    so a node that cuts off on an early move never generates or sorts its quiet moves
+    game has to be back in the same position whenever the next move is asked for"""
+    if hash_move is not None and game.is_legal_move(hash_move):
+        yield hash_move
     else:
-        return 0
+        hash_move = None
 
-def minimax(game: Game, depth: int, alpha: int, beta: int) -> tuple[int, tuple[tuple[int, int], tuple[int, int]] | None]:
-    if depth == 0 or game.king_taken():
-        return base_evaluation(game, depth), None
-    
-    legal_moves = game.get_legal_moves()
-    legal_moves.sort(key=lambda move: move_ordering_key(move, game), reverse=True)
-
-    if game.get_white_move():
-        best_score = int(-1e10)
-        best_move = None
-        for move in legal_moves:
-            game_copy = game.copy()
-            start_number = game_copy.get_number_of_pieces()
-            game_copy.make_move(*move)
-            end_number = game_copy.get_number_of_pieces()
-            if start_number != end_number and depth == 1:
-                decrement = 0
+    white = game.white_move
+    winning_captures = []
+    losing_captures = []
+    for move in game.generate_legal_captures():
+        if move == hash_move:
+            continue
+        if move & MOVE_CAPTURE:
+            score = mvv_lva_score(move, game)
+            attacker_value = piece_values[game.squares[move_start_square(move)] & 7]  # type: ignore (moves start on a piece)
+            victim_value = piece_values[piece.PAWN] if move & MOVE_EN_PASSANT else piece_values[game.squares[move_end_square(move)] & 7]  # type: ignore
+            # taking something worth less with a piece that can be taken back straight away probably loses material
+            if victim_value < attacker_value and game.is_square_attacked(move_end_square(move), not white):
+                losing_captures.append((score, move))
+                continue
+            score += CAPTURE_SCORE
+        else:
+            score = PROMOTION_SCORE + move_promotion_piece(move)
+        winning_captures.append((score, move))
+    winning_captures.sort(reverse=True)
+    for score, move in winning_captures:
+        yield move
+
+    refutations = []
+    killers = context.killers[ply]
+    counter_move = context.counter_moves[previous_move & 0xFFF] if previous_move is not None else None
+    for move in (killers[0], killers[1], counter_move):
+        if move is not None and move != hash_move and move not in refutations and game.is_legal_move(move) and not is_tactical(move):
+            refutations.append(move)
+            yield move
+
+    history = context.history[white]
+    quiet_moves = [move for move in game.generate_legal_quiet_moves() if move != hash_move and move not in refutations]
+    quiet_moves.sort(key=lambda move: history[move & 0xFFF], reverse=True)
+    yield from quiet_moves
+
+    losing_captures.sort(reverse=True)
+    for score, move in losing_captures:
+        yield move
+
+class SearchAborted(Exception):
+    """raised from inside the search when a search runs out of time or nodes, or is stopped"""
+
+
+class SearchContext:
+    """limits and counters for one search, passed down through negamax"""
+    def __init__(self, hard_deadline: float | None = None, max_nodes: int | None = None, quiescence_max_depth: int = QUIESCENCE_MAX_DEPTH,
+                 stop_event=None, null_move_pruning: bool = NULL_MOVE_PRUNING, late_move_reductions: bool = LATE_MOVE_REDUCTIONS,
+                 futility_pruning: bool = FUTILITY_PRUNING):
+        self.hard_deadline = hard_deadline  # a time.perf_counter() value
+        self.max_nodes = max_nodes
+        self.quiescence_max_depth = quiescence_max_depth
+        self.reset_counters()
+        self.stopped = False  # can be set from another thread to abort the search
+        self.stop_event = stop_event  # a multiprocessing.Event, for stopping searches in other processes
+        self.null_move_pruning = null_move_pruning
+        self.late_move_reductions = late_move_reductions
+        self.futility_pruning = futility_pruning
+        self.statistics = SearchStatistics()  # see iterative_deepening
+        self.excluded_root_moves: set[int] = set()  # for multi pv, the lines already found aren't searched again
+        self.lines: list[tuple[int, int, list[int]]] = []  # (white positive evaluation, move, principal variation) best first
+        self.pv_moves: dict[int, int] = {}  # zobrist key -> move, from the last completed iteration's principal variation
+        # quiet moves that caused cutoffs, see update_quiet_move_heuristics. moves are indexed by their start and end squares (move & 0xFFF)
+        self.killers: list[list[int | None]] = [[None, None] for _ in range(MAX_SEARCH_DEPTH + 1)]  # two per ply
+        self.history: list[list[int]] = [[0] * 4096, [0] * 4096]  # butterfly table, indexed by white then move
+        self.counter_moves: list[int | None] = [None] * 4096  # indexed by the move it refuted
+
+    def update_quiet_move_heuristics(self, move: int, depth: int, ply: int, white: bool, previous_move: int | None):
+        killers = self.killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+        history = self.history[white]
+        history[move & 0xFFF] += depth * depth
+        if history[move & 0xFFF] >= HISTORY_LIMIT:
+            for table in self.history:
+                for index in range(4096):
+                    table[index] //= 2
+        if previous_move is not None:
+            self.counter_moves[previous_move & 0xFFF] = move
+
+    def reset_counters(self):
+        """counters for SearchStatistics, nodes includes quiescence nodes"""
+        self.nodes = 0
+        self.quiescence_nodes = 0
+        self.table_probes = 0
+        self.table_hits = 0
+        self.table_cutoffs = 0  # probes that returned without searching
+        self.cutoffs = 0  # beta cutoffs, and how many of them were on the first move tried
+        self.first_move_cutoffs = 0
+
+    def counters(self) -> dict[str, int]:
+        return {name: getattr(self, name) for name in COUNTER_NAMES}
+
+    def check_limits(self):
+        if self.stopped:
+            raise SearchAborted
+        if self.stop_event is not None and self.stop_event.is_set():
+            self.stopped = True
+            raise SearchAborted
+        if self.hard_deadline is not None and time.perf_counter() >= self.hard_deadline:
+            self.stopped = True
+            raise SearchAborted
+        if self.max_nodes is not None and self.nodes >= self.max_nodes:
+            self.stopped = True
+            raise SearchAborted
+
+def score_to_transposition_table(score: int, depth: int) -> int:
+    """mate scores count the depth left when the king goes, which depends on how deep this node was searched from,
+    so they are stored relative to this node instead"""
+    if score > MATE_THRESHOLD:
+        return score - depth
+    if score < -MATE_THRESHOLD:
+        return score + depth
+    return score
+
+def score_from_transposition_table(score: int, depth: int) -> int:
+    if score > MATE_THRESHOLD:
+        return score + depth
+    if score < -MATE_THRESHOLD:
+        return score - depth
+    return score
+
+def minimax(game: Game, depth: int, alpha: int, beta: int, context: SearchContext | None = None,
+            ply: int = 0, previous_move: int | None = None) -> tuple[int, int | None]:
+    """negamax with white positive scores and window, for callers that don't care whose move it is"""
+    if game.white_move:
+        return negamax(game, depth, alpha, beta, context, ply, previous_move)
+    value, move = negamax(game, depth, -beta, -alpha, context, ply, previous_move)
+    return -value, move
+
+def negamax(game: Game, depth: int, alpha: int, beta: int, context: SearchContext | None = None,
+            ply: int = 0, previous_move: int | None = None) -> tuple[int, int | None]:
+    """returns the evaluation for the side to move and the best packed move, ply and previous_move are for move ordering
+    previous_move is None at the root and after a null move, neither of which try a null move themselves
+    raises SearchAborted if context's limits are hit, leaving moves made on game"""
+    if context is None:
+        context = SearchContext()
+    if depth <= 0:
+        return quiescence(game, alpha, beta, context, 0), None
+    context.nodes += 1
+    if not context.nodes % LIMIT_CHECK_INTERVAL:
+        context.check_limits()
+    white = game.white_move
+    if game.king_taken():
+        return evaluate(game, depth) if white else -evaluate(game, depth), None
+
+    key = game.zobrist_key()
+    hash_move = None
+    context.table_probes += 1
+    entry = transposition_table.probe(key)
+    # a root searched without some of its moves can't use or store the whole position's result
+    excluding = ply == 0 and bool(context.excluded_root_moves)
+    if entry is not None:
+        context.table_hits += 1
+        entry_depth, flag, score, hash_move = entry
+        if entry_depth >= depth and not excluding:
+            score = score_from_transposition_table(score, depth)
+            if flag == EXACT:
+                context.table_cutoffs += 1
+                return score, hash_move
+            elif flag == LOWER_BOUND:
+                alpha = max(alpha, score)
             else:
-                decrement = 1
-            value, nested_move = minimax(game_copy, depth - decrement, alpha, beta)
-            if value > best_score:
-                best_score = value
-                best_move = move
-            alpha = max(alpha, best_score)
+                beta = min(beta, score)
             if beta <= alpha:
-                break
-        return best_score, best_move
+                context.table_cutoffs += 1
+                return score, hash_move
+    hash_move = context.pv_moves.get(key, hash_move)
+    window_alpha, window_beta = alpha, beta
+
+    in_check = game.in_check()
+    static_evaluation = evaluate(game, depth) if white else -evaluate(game, depth)
+    # null move pruning, if passing still leaves this side above beta a real move almost certainly would too.
+    # not tried with only pawns left, where passing is often better than any move (zugzwang) and the idea breaks down
+    if (context.null_move_pruning and previous_move is not None and depth > NULL_MOVE_REDUCTION and not in_check
+            and abs(beta) < MATE_THRESHOLD and static_evaluation >= beta and has_non_pawn_material(game, white)):
+        null_undo = game.make_null_move()
+        value = -negamax(game, depth - 1 - NULL_MOVE_REDUCTION, -beta, -beta + 1, context, ply + 1, None)[0]
+        game.unmake_null_move(null_undo)
+        if value >= beta:
+            return beta, None
+    # futility pruning, this close to the leaves a quiet move can't make up a position this far below alpha
+    futile = (context.futility_pruning and depth < len(FUTILITY_MARGINS) and not in_check and abs(alpha) < MATE_THRESHOLD
+              and static_evaluation + FUTILITY_MARGINS[depth] <= alpha)
+    can_reduce = context.late_move_reductions and depth >= LMR_MIN_DEPTH and not in_check
+
+    # the best move from last time this position was searched is usually still best, so it goes first
+    moves = pick_moves(game, context, ply, hash_move, previous_move)
+    best_score = -INFINITE_SCORE
+    best_move = None
+    for move_number, move in enumerate(moves):
+        if excluding and move in context.excluded_root_moves:
+            continue
+        undo = game.make_packed_move(move)
+        quiet = not is_tactical(move)
+        if best_move is None:
+            value = -negamax(game, depth - 1, -beta, -alpha, context, ply + 1, move)[0]
+        else:
+            reduction = 0
+            if quiet and (futile or (can_reduce and move_number >= LMR_MIN_MOVES)) and not game.in_check():
+                if futile:
+                    game.unmake_move(undo)
+                    # a fail low has to stay an upper bound on the pruned move too, so it's scored as the most it could be
+                    best_score = max(best_score, static_evaluation + FUTILITY_MARGINS[depth])
+                    continue
+                # late move reductions, moves this far down the ordering rarely beat the ones before them
+                reduction = 2 if move_number >= 2 * LMR_MIN_MOVES and depth >= 2 * LMR_MIN_DEPTH else 1
+            # principal variation search, the first move is assumed best so the rest only get a null window search to
+            # prove they're worse, and a full one if that fails. reduced moves have to fail at full depth too
+            value = -negamax(game, depth - 1 - reduction, -alpha - 1, -alpha, context, ply + 1, move)[0]
+            if value > alpha and reduction:
+                value = -negamax(game, depth - 1, -alpha - 1, -alpha, context, ply + 1, move)[0]
+            if alpha < value < beta:
+                value = -negamax(game, depth - 1, -beta, -alpha, context, ply + 1, move)[0]
+        game.unmake_move(undo)
+        if value > best_score:
+            best_score = value
+            best_move = move
+            if value > alpha:
+                alpha = value
+                if alpha >= beta:
+                    context.cutoffs += 1
+                    if move_number == 0:
+                        context.first_move_cutoffs += 1
+                    if quiet:
+                        context.update_quiet_move_heuristics(move, depth, ply, white, previous_move)
+                    break
+    if best_move is None:
+        return checkmate_or_stalemate_score(game, depth), None
+    if not excluding:
+        store_result(key, depth, best_score, best_move, window_alpha, window_beta)
+    return best_score, best_move
+
+def has_non_pawn_material(game: Game, white: bool) -> bool:
+    return any(game.piece_counts[non_pawn_piece] for non_pawn_piece in NON_PAWN_PIECES[white])
+
+def checkmate_or_stalemate_score(game: Game, depth: int) -> int:
+    """score for the side to move having no legal moves, mates found with more depth left are sooner so score higher"""
+    if not game.in_check():
+        return 0
+    return -MATE_SCORE - depth
+
+def capture_gain(move: int, game: Game) -> int:
+    """material the side to move wins with a capture or promotion, before any recapture"""
+    gain = 0
+    if move & MOVE_EN_PASSANT:
+        gain = piece_values[piece.PAWN]
+    elif move & MOVE_CAPTURE:
+        gain = piece_values[piece.get_piece_type(game.squares[move_end_square(move)])]  # type: ignore (captures land on a piece)
+    promotion_piece = move_promotion_piece(move)
+    if promotion_piece:
+        gain += piece_values[promotion_piece] - piece_values[piece.PAWN]
+    return gain
+
+def quiescence(game: Game, alpha: int, beta: int, context: SearchContext, quiescence_depth: int) -> int:
+    """search only captures and promotions past the horizon until the position is quiet, so a leaf isn't scored in the
+    middle of an exchange. the side to move can always stand pat (keep the evaluation) instead of capturing
+    scores are for the side to move, like negamax"""
+    context.nodes += 1
+    context.quiescence_nodes += 1
+    if not context.nodes % LIMIT_CHECK_INTERVAL:
+        context.check_limits()
+    stand_pat = evaluate(game, 0) if game.white_move else -evaluate(game, 0)
+    if game.king_taken():
+        return stand_pat
+    if stand_pat >= beta:
+        return stand_pat
+    alpha = max(alpha, stand_pat)
+
+    if quiescence_depth >= context.quiescence_max_depth:
+        return stand_pat
+
+    best_score = stand_pat
+    tactical_moves = []
+    for move in game.generate_legal_captures():
+        # delta pruning, even winning the piece for free can't bring this back up to alpha. the score returned has to
+        # stay an upper bound on the pruned capture too, so it's raised to the most that capture could have been worth
+        optimistic_score = stand_pat + capture_gain(move, game) + DELTA_MARGIN
+        if optimistic_score <= alpha:
+            best_score = max(best_score, optimistic_score)
+            continue
+        tactical_moves.append(move)
+    tactical_moves.sort(key=lambda move: mvv_lva_score(move, game) if move & MOVE_CAPTURE else move_promotion_piece(move), reverse=True)
+
+    for move in tactical_moves:
+        undo = game.make_packed_move(move)
+        value = -quiescence(game, -beta, -alpha, context, quiescence_depth + 1)
+        game.unmake_move(undo)
+        if value > best_score:
+            best_score = value
+            if value > alpha:
+                alpha = value
+                if alpha >= beta:
+                    break
+    return best_score
+
+def store_result(key: int, depth: int, score: int, move: int | None, alpha: int, beta: int):
+    """store a searched node, its score is only a bound if it fell outside the window it was searched with"""
+    if score <= alpha:
+        flag = UPPER_BOUND
+    elif score >= beta:
+        flag = LOWER_BOUND
     else:
-        best_score = int(1e10)
-        best_move = None
-        for move in legal_moves:
-            game_copy = game.copy()
-            game_copy.make_move(*move)
-            value, nested_move = minimax(game_copy, depth - 1, alpha, beta)
-            if value < best_score:
-                best_score = value
-                best_move = move
-            beta = min(beta, best_score)
-            if beta <= alpha:
-                break
-        return best_score, best_move
-    
-def get_value_and_best_move(game: Game, depth: int) -> tuple[int, tuple[tuple[int, int], tuple[int, int]] | None]:
-    global nodes_counted
-    nodes_counted = 0
+        flag = EXACT
+    transposition_table.store(key, depth, flag, score_to_transposition_table(score, depth), move)
+
+def get_value_and_best_move(game: Game, depth: int, threads: int | None = None, split_root_moves: bool = False,
+                            return_statistics: bool = False, multi_pv: int = 1) -> tuple:
+    """returns the evaluation and best move, the move in (start_pos, end_pos) format for the UI and server,
+    then if multi_pv > 1 the multi_pv best lines as (evaluation, move, uci principal variation) best first,
+    and the search's SearchStatistics last if return_statistics
+    split_root_moves shares the root moves out between a pool of threads processes (the engine threads preference by
+    default) instead of using the lazy smp helpers, whose number is set with set_search_threads.
+    multi pv searches never split root moves or play from the opening book"""
+    threads = min(MAX_SEARCH_THREADS, threads if threads is not None else preferences[Prefs.ENGINE_THREADS])
+    split_root_moves = split_root_moves and threads > 1 and multi_pv <= 1
+    transposition_table.new_search()
     t0 = time.time()
     
+    opening = opening_book_move(game) if multi_pv <= 1 else None
+    if opening is not None:
+        print(f"Opening found in {time.time() - t0} seconds")
+        value, move = opening
+        statistics = SearchStatistics()
+        statistics.record_iteration(0, value, [packed_move_to_uci(move)])
+        statistics.finish()
+        return (value, packed_move_to_pos_move(move)) + ((statistics,) if return_statistics else ())
+
+    if split_root_moves:
+        value, move, completed_depth, statistics = split_root_move_search(
+            game, threads, soft_time=preferences[Prefs.MINIMUM_ENGINE_TIME], hard_time=preferences[Prefs.MAXIMUM_ENGINE_TIME], min_depth=depth)
+        lines = []
+    else:
+        context = SearchContext()
+        value, move, completed_depth, principal_variation = lazy_smp_search(
+            game, context, soft_time=preferences[Prefs.MINIMUM_ENGINE_TIME], hard_time=preferences[Prefs.MAXIMUM_ENGINE_TIME], min_depth=depth,
+            multi_pv=multi_pv)
+        statistics, lines = context.statistics, context.lines
+    print(statistics.summary())
+    log_statistics(statistics, fen=game.get_fen(), threads=threads if split_root_moves else search_threads(), split_root_moves=split_root_moves,
+                   multi_pv=multi_pv)
+    pos_move = packed_move_to_pos_move(move) if move is not None else None
+    result = (value, pos_move)
+    if multi_pv > 1:
+        result += ([(line_value, packed_move_to_pos_move(line_move), [packed_move_to_uci(pv_move) for pv_move in line_pv])
+                    for line_value, line_move, line_pv in lines],)
+    return result + ((statistics,) if return_statistics else ())
+
+def opening_book_move(game: Game) -> tuple[int, int] | None:
+    """a weighted random (value, packed move) from the opening book, or None if the position isn't in it.
+    one time in three the book isn't used at all, so games don't always go the same way"""
     legal_openings = []
     if random.randint(1, 3) != 1:
-        for move in game.get_legal_moves():
-            game_copy = game.copy()
-            game_copy.make_move(*move)
-            fen = game_copy.get_truncated_fen()
+        for move in game.generate_legal_moves():
+            undo = game.make_packed_move(move)
+            fen = game.get_truncated_fen()
+            game.unmake_move(undo)
             if fen in OPENING_VALUES:
                 legal_openings.append((OPENING_VALUES[fen], move))
     if len(legal_openings) > 0:
@@ -228,35 +460,445 @@ def get_value_and_best_move(game: Game, depth: int) -> tuple[int, tuple[tuple[in
         move = random.choices(moves, weights)[0]
         for opening in legal_openings:
             if opening[1] == move:
-                print(f"Opening found in {time.time() - t0} seconds")
-                return opening[0], move
+                return opening
+    return None
+
+@contextlib.contextmanager
+def searching():
+    """held by every search that uses the transposition table, so set_search_threads never swaps it out from under one"""
+    global searches_running
+    with search_threads_condition:
+        searches_running += 1
+    try:
+        yield
+    finally:
+        with search_threads_condition:
+            searches_running -= 1
+            search_threads_condition.notify_all()
+
+def lazy_smp_search(game: Game, context: SearchContext, **search_options) -> tuple[int, int | None, int, list[int]]:
+    """iterative_deepening with the lazy smp helpers searching alongside if there are any, search_options are passed on to it"""
+    with searching():
+        return lazy_smp_search_with_helpers(game, context, **search_options)
+
+def lazy_smp_search_with_helpers(game: Game, context: SearchContext, **search_options) -> tuple[int, int | None, int, list[int]]:
+    helpers = search_helpers
+    # another search already using the helpers (the server can run several at once) just goes without them
+    if helpers is not None and not helpers.lock.acquire(blocking=False):
+        helpers = None
+    helper_results = []
+    try:
+        if helpers is not None:
+            helpers.start(game, transposition_table.age)
+        value, move, completed_depth, principal_variation = iterative_deepening(game, context=context, **search_options)
+    finally:
+        if helpers is not None:
+            helper_results = helpers.stop()
+            helpers.lock.release()
+    # a helper that got further than the main search has the better move, multi pv lines only come from the main search
+    if search_options.get("multi_pv", 1) <= 1 and helper_results:
+        helper_depth, helper_value, helper_move = max(helper_results, key=lambda result: result[0])
+        if helper_depth > completed_depth and helper_move is not None:
+            value, move, completed_depth = helper_value, helper_move, helper_depth
+            principal_variation = get_principal_variation(game, completed_depth)
+            if principal_variation[:1] != [move]:
+                principal_variation = [move]
+    return value, move, completed_depth, principal_variation
+
+def get_principal_variation(game: Game, depth: int) -> list[int]:
+    """follow best moves through the transposition table, game is left as it was"""
+    principal_variation = []
+    undos = []
+    seen = set()
+    while len(principal_variation) < depth and game.zobrist_key() not in seen:
+        seen.add(game.zobrist_key())
+        move = transposition_table.best_move(game.zobrist_key())
+        if move is None or move not in game.generate_legal_moves():
+            break
+        principal_variation.append(move)
+        undos.append(game.make_packed_move(move))
+    for undo in reversed(undos):
+        game.unmake_move(undo)
+    return principal_variation
+
+def seed_principal_variation(game: Game, principal_variation: list[int], context: SearchContext):
+    """make the next iteration try the last one's principal variation first, even if the table has lost it"""
+    context.pv_moves = {}
+    undos = []
+    for move in principal_variation:
+        context.pv_moves[game.zobrist_key()] = move
+        undos.append(game.make_packed_move(move))
+    for undo in reversed(undos):
+        game.unmake_move(undo)
+
+def aspiration_search(game: Game, depth: int, previous_value: int | None, context: SearchContext) -> tuple[int, int | None]:
+    """search the root with a narrow window around the last iteration's (white positive) score, the score rarely moves
+    far between iterations and a narrow window cuts off much more. a search that falls outside it is repeated with
+    that side of the window four times wider, until it's the full window"""
+    white = game.white_move
+    if previous_value is None or abs(previous_value) > MATE_THRESHOLD:
+        return minimax(game, depth, -INFINITE_SCORE, INFINITE_SCORE, context)
+    previous_score = previous_value if white else -previous_value
+    alpha_delta = beta_delta = ASPIRATION_WINDOW
+    while True:
+        alpha = previous_score - alpha_delta if alpha_delta < MATE_THRESHOLD else -INFINITE_SCORE
+        beta = previous_score + beta_delta if beta_delta < MATE_THRESHOLD else INFINITE_SCORE
+        score, move = negamax(game, depth, alpha, beta, context)
+        if score <= alpha and alpha > -INFINITE_SCORE:
+            alpha_delta *= 4
+        elif score >= beta and beta < INFINITE_SCORE:
+            beta_delta *= 4
+        else:
+            return (score if white else -score), move
+
+def iterative_deepening(game: Game, max_depth: int = MAX_SEARCH_DEPTH, soft_time: float | None = None, hard_time: float | None = None,
+                        max_nodes: int | None = None, min_depth: int = 1, context: SearchContext | None = None,
+                        start_depth: int = 1, on_iteration=None, multi_pv: int = 1) -> tuple[int, int | None, int, list[int]]:
+    """search one ply deeper at a time until a limit is hit, returns the evaluation, best packed move,
+    depth of the last completed iteration and its principal variation
+    soft_time is seconds after which no new iteration starts once min_depth is done,
+    hard_time and max_nodes abandon the iteration in progress and the last completed one is used,
+    the first iteration always finishes so there is always a move
+    on_iteration is called with the depth, evaluation, move, principal variation and context after every completed depth
+    multi_pv > 1 also finds the next best root moves each iteration, by searching the root again without the ones
+    already found. they're left in context.lines, best first, and cost much less than the first thanks to the tables"""
+    t0 = time.perf_counter()
+    game = game.copy()  # an abandoned iteration leaves its moves made on the board
+    if context is None:
+        context = SearchContext()
+    context.reset_counters()
+    context.statistics = statistics = SearchStatistics()
+    value, move, completed_depth, principal_variation = 0, None, 0, []
+    context.lines = []
+    multi_pv = min(multi_pv, len(game.generate_legal_moves()))
+    for depth in range(start_depth, max_depth + 1):
+        if depth == start_depth + 1:
+            context.hard_deadline = t0 + hard_time if hard_time is not None else None
+            context.max_nodes = max_nodes
+        try:
+            value, move = aspiration_search(game, depth, value if depth > start_depth else None, context)
+            lines = [(value, move)]
+            if multi_pv > 1 and move is not None:
+                context.excluded_root_moves = {move}
+                try:
+                    while len(lines) < multi_pv:
+                        line_value, line_move = minimax(game, depth, -INFINITE_SCORE, INFINITE_SCORE, context)
+                        lines.append((line_value, line_move))
+                        context.excluded_root_moves.add(line_move)
+                finally:
+                    context.excluded_root_moves = set()
+        except SearchAborted:
+            break
+        completed_depth = depth
+        principal_variation = get_principal_variation(game, depth)
+        seed_principal_variation(game, principal_variation, context)
+        context.lines = [(value, move, principal_variation)]
+        for line_value, line_move in lines[1:]:
+            undo = game.make_packed_move(line_move)
+            context.lines.append((line_value, line_move, [line_move] + get_principal_variation(game, depth - 1)))
+            game.unmake_move(undo)
+        statistics.record_iteration(depth, value, [packed_move_to_uci(pv_move) for pv_move in principal_variation], context.counters())
+        if on_iteration is not None:
+            on_iteration(depth, value, move, principal_variation, context)
+        if move is None or abs(value) > MATE_THRESHOLD:
+            break  # no legal moves, or a forced mate has been found so searching deeper won't change anything
+        if context.stopped or (depth >= min_depth and soft_time is not None and time.perf_counter() - t0 >= soft_time):
+            break
+    statistics.finish(context.counters())
+    return value, move, completed_depth, principal_variation
+
 
-    value, move = minimax(game, depth, int(-1e10), int(1e10))
-    t1 = time.time()
-    if t1 - t0 < preferences[Prefs.MINIMUM_ENGINE_TIME]:
-        return get_value_and_best_move(game, depth + 1)
+def helper_search_loop(jobs, finished, stop_event, table_name: str):
+    """body of each lazy smp helper process, it searches whatever position it is sent until stop_event is set
+    most of what they give the main search is what they store in the shared transposition table, but each also sends
+    back (depth, value, move) for the last depth it completed, or None if it failed"""
+    global transposition_table
+    transposition_table = SharedTranspositionTable(name=table_name)
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        state, age, start_depth = job
+        transposition_table.age = age
+        result = None
+        try:
+            value, move, completed_depth, _ = iterative_deepening(Game.from_state(*state), context=SearchContext(stop_event=stop_event),
+                                                                  start_depth=start_depth)
+            result = (completed_depth, value, move)
+        except Exception:
+            # the helper has to stay alive for the next job, SearchHelpers.stop waits for an answer from every one
+            logger.exception("lazy smp helper search failed")
+        finished.put(result)
+    transposition_table.close()
+
+
+class SearchHelpers:
+    """lazy smp: helper processes search the same position as the main search at the same time, and because they
+    share its transposition table they fill it with results the main search can cut off on. they're started once
+    and kept waiting for positions, half start a ply deeper so they aren't all searching the same tree in step"""
+    def __init__(self, count: int, table: SharedTranspositionTable):
+        context = multiprocessing.get_context("spawn")  # forking a process with pygame or flask threads running isn't safe
+        self.jobs = context.Queue()
+        self.finished = context.Queue()
+        self.stop_event = context.Event()
+        self.lock = threading.Lock()  # only one search at a time can use the helpers
+        self.count = count
+        self.processes = [context.Process(target=helper_search_loop, args=(self.jobs, self.finished, self.stop_event, table.name), daemon=True)
+                          for _ in range(count)]
+        for process in self.processes:
+            process.start()
+
+    def start(self, game: Game, age: int):
+        self.stop_event.clear()
+        state = game.get_state()
+        for index in range(len(self.processes)):
+            self.jobs.put((state, age, 1 + index % 2))
+
+    def stop(self) -> list[tuple[int, int, int | None]]:
+        """stop the helpers and wait for them, so they never carry on with an old position
+        returns each helper's (depth, value, move) result, see helper_search_loop"""
+        self.stop_event.set()
+        results = [self.finished.get() for _ in self.processes]
+        return [result for result in results if result is not None]
+
+    def close(self):
+        for _ in self.processes:
+            self.jobs.put(None)
+        for process in self.processes:
+            process.join(timeout=1)
+            if process.is_alive():
+                process.terminate()
+
+
+def search_threads() -> int:
+    return search_helpers.count + 1 if search_helpers is not None else 1
+
+def set_search_threads(threads: int):
+    """search with this many processes from now on (clamped to 1 to MAX_SEARCH_THREADS), one main search and
+    threads - 1 lazy smp helpers. the transposition table is moved into shared memory for more than one, which starts
+    it empty. waits for any searches in progress to finish first, and new ones wait for this"""
+    with search_threads_condition:
+        search_threads_condition.wait_for(lambda: searches_running == 0)
+        replace_search_threads(min(MAX_SEARCH_THREADS, max(1, threads)))
+
+def replace_search_threads(threads: int):
+    global transposition_table, search_helpers
+    if search_threads() == threads:
+        return
+    if search_helpers is not None:
+        search_helpers.close()
+        search_helpers = None
+    if isinstance(transposition_table, SharedTranspositionTable):
+        transposition_table.close()
+    if threads == 1:
+        transposition_table = TranspositionTable(TRANSPOSITION_TABLE_MEGABYTES)
     else:
-        print(f"{nodes_counted} nodes counted in {time.time() - t0} seconds at depth {depth}")
-        return value, move
-    
+        transposition_table = SharedTranspositionTable(TRANSPOSITION_TABLE_MEGABYTES)
+        search_helpers = SearchHelpers(threads - 1, transposition_table)
+        atexit.register(close_search_threads)  # the shared table has to be unlinked or it outlives the program
+
+def set_transposition_table_megabytes(megabytes: float):
+    """resize the table, which empties it. waits for searches in progress like set_search_threads"""
+    global TRANSPOSITION_TABLE_MEGABYTES
+    with search_threads_condition:
+        search_threads_condition.wait_for(lambda: searches_running == 0)
+        TRANSPOSITION_TABLE_MEGABYTES = megabytes
+        if search_helpers is None:
+            transposition_table.resize(megabytes)
+            return
+        threads = search_threads()  # a shared table can't be resized, so it and the helpers using it start again
+        close_search_threads()
+        replace_search_threads(threads)
+
+def close_search_threads():
+    global search_helpers
+    if search_helpers is not None:
+        search_helpers.close()
+        search_helpers = None
+    if isinstance(transposition_table, SharedTranspositionTable):
+        transposition_table.close()
+
+
+def search_root_move(state: State, move: int, depth: int, alpha: int, beta: int, seconds: float | None,
+                     age: int) -> tuple[int | None, dict[str, int]]:
+    """root split worker, searches the position after one root move and returns its score (None if it ran out of time)
+    and the search's counters. each pool process keeps its own transposition table between calls"""
+    transposition_table.age = age
+    game = Game.from_state(*state)
+    game.make_packed_move(move)
+    context = SearchContext(hard_deadline=time.perf_counter() + seconds if seconds is not None else None)
+    try:
+        value, _ = minimax(game, depth - 1, alpha, beta, context, 1, move)
+    except SearchAborted:
+        return None, context.counters()
+    return value, context.counters()
+
+def get_root_move_pool(processes: int) -> ProcessPoolExecutor:
+    """the pool is only made again if the number of processes changes, starting processes costs more than most searches"""
+    global root_move_pool, root_move_pool_processes
+    if root_move_pool is not None and root_move_pool_processes != processes:
+        close_root_move_pool()
+    if root_move_pool is None:
+        root_move_pool = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn"))
+        root_move_pool_processes = processes
+        atexit.register(close_root_move_pool)
+    return root_move_pool
+
+def close_root_move_pool():
+    global root_move_pool
+    if root_move_pool is not None:
+        root_move_pool.shutdown(cancel_futures=True)
+        root_move_pool = None
+
+def split_root_move_search(game: Game, processes: int, max_depth: int = MAX_SEARCH_DEPTH, soft_time: float | None = None,
+                           hard_time: float | None = None, min_depth: int = 1) -> tuple[int, int | None, int, SearchStatistics]:
+    """iterative deepening with each iteration's root moves shared out between a pool of processes, returns the
+    evaluation, best packed move, depth of the last completed iteration and statistics summed over the pool
+    the previous best move is searched first on its own so the rest start with a real bound (young brothers wait),
+    and every move sent after that gets the bound as tightened by the results back so far
+    the limits mean the same as in iterative_deepening
+    each root move at each depth is a separate job with a cold private table, so this is slower than lazy_smp_search
+    (and than one process) on the positions measured so far. it's only used when asked for, like the server's split=1"""
+    t0 = time.perf_counter()
+    statistics = SearchStatistics()
+    pool = get_root_move_pool(processes)
+    white = game.white_move
+    state = game.get_state()
+    age = transposition_table.age
+    root_moves = list(game.generate_legal_moves())
+    if not root_moves:
+        statistics.finish()
+        return minimax(game, 1, -INFINITE_SCORE, INFINITE_SCORE)[0], None, 0, statistics
+    value, best_move, completed_depth = 0, None, 0
+    scores = {move: 0 for move in root_moves}
+    for depth in range(1, max_depth + 1):
+        seconds = None if depth == 1 or hard_time is None else hard_time - (time.perf_counter() - t0)
+        if seconds is not None and seconds <= 0:
+            break
+        # best first from the last iteration, so the eldest brother is the move most likely to stay best
+        root_moves.sort(key=lambda move: scores[move], reverse=white)
+        alpha, beta = -INFINITE_SCORE, INFINITE_SCORE
+        iteration_best = None
+        aborted = False
+        waiting = iter(root_moves)
+        running = {pool.submit(search_root_move, state, next(waiting), depth, alpha, beta, seconds, age): root_moves[0]}
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                move = running.pop(future)
+                score, counters = future.result()
+                statistics.add_counters(counters)
+                if score is None:
+                    aborted = True
+                    continue
+                scores[move] = score
+                if iteration_best is None or (score > scores[iteration_best] if white else score < scores[iteration_best]):
+                    iteration_best = move
+                if white:
+                    alpha = max(alpha, score)
+                else:
+                    beta = min(beta, score)
+            if aborted:
+                for future in running:
+                    future.cancel()
+                wait(running)
+                break
+            for move in waiting:
+                running[pool.submit(search_root_move, state, move, depth, alpha, beta, seconds, age)] = move
+                if len(running) >= processes:
+                    break
+        if aborted or iteration_best is None:
+            break
+        value, best_move, completed_depth = scores[iteration_best], iteration_best, depth
+        statistics.record_iteration(depth, value, [packed_move_to_uci(best_move)])
+        if abs(value) > MATE_THRESHOLD:
+            break
+        if depth >= min_depth and soft_time is not None and time.perf_counter() - t0 >= soft_time:
+            break
+    statistics.finish()
+    return value, best_move, completed_depth, statistics
+
 
 class Engine:
-    def __init__(self, game_copy: Game):
-        self.game = game_copy
-        self.depth = 2
-        self.best_move = None
-        self.evaluation = 0
-        self.running = True
+    """long lived background analysis, one worker thread searches whatever position it was last given, a ply deeper at
+    a time, until it's stopped or sent a new one. commands return straight away and the search in progress is abandoned
+    at its next limit check. the latest completed depth is read with snapshot, which is safe from any thread
+    the lazy smp helpers search alongside it when no other search is using them, see set_search_threads"""
+    def __init__(self, game: Game | None = None):
+        self.commands: queue.Queue[tuple[str, tuple[Game, int] | None]] = queue.Queue()
+        self.lock = threading.Lock()  # guards context and result, and makes sending a command and stopping the search one step
+        self.context: SearchContext | None = None  # the search in progress
+        self.result = self.new_result(False)
         self.thread = threading.Thread(target=self.run, daemon=True)
         self.thread.start()
-    
+        if game is not None:
+            self.start(game)
+
+    def new_result(self, running: bool) -> dict:
+        return {"running": running, "depth": 0, "score": 0, "best_move": None, "principal_variation": [], "lines": [], "nodes": 0,
+                "statistics": None}
+
+    def start(self, game: Game, multi_pv: int = 1):
+        """analyse a copy of game, replacing any search in progress. multi_pv > 1 finds that many best lines"""
+        self.send("start", (game.copy(), multi_pv))
+
+    def stop(self):
+        """the last snapshot is kept"""
+        self.send("stop")
+
+    def close(self):
+        """stop searching and end the worker thread"""
+        self.send("quit")
+        self.thread.join(timeout=1)
+
+    def send(self, command: str, position: tuple[Game, int] | None = None):
+        with self.lock:
+            if self.context is not None:
+                self.context.stopped = True
+                self.context = None  # the abandoned search's last iterations and its end leave the result alone
+            if command == "start":
+                self.result = self.new_result(True)  # so a snapshot straight after never shows the old position's result
+            self.commands.put((command, position))
+
+    def snapshot(self) -> dict:
+        """running, the depth completed, its white positive score, best move in (start_pos, end_pos) format,
+        principal variation in uci, the multi pv lines as (score, best move, principal variation) like those,
+        the nodes searched and the search's statistics as a dict"""
+        with self.lock:
+            return {**self.result, "principal_variation": self.result["principal_variation"][:], "lines": self.result["lines"][:]}
+
     def run(self):
         while True:
-            if self.running:
-                self.evaluation, self.best_move = minimax(self.game, self.depth, int(-1e10), int(1e10))
-                self.depth += 1
+            command, position = self.commands.get()  # blocks, an idle engine uses no cpu
+            if command == "quit":
+                break
+            with self.lock:
+                if not self.commands.empty():  # already replaced by a newer command
+                    continue
+                if command == "stop":
+                    self.result["running"] = False
+                    continue
+                context = self.context = SearchContext()
+                self.result = self.new_result(True)
+            assert position is not None
+            game, multi_pv = position
+            transposition_table.new_search()
+            lazy_smp_search(game, context, on_iteration=self.record_iteration, multi_pv=multi_pv)
+            with self.lock:
+                if self.context is context:  # not already replaced by a newer command's result
+                    self.context = None
+                    self.result["running"] = False
+
+    def record_iteration(self, depth: int, value: int, move: int | None, principal_variation: list[int], context: SearchContext):
+        with self.lock:
+            if context is not self.context:
+                return
+            self.result.update(depth=depth, score=value, best_move=packed_move_to_pos_move(move) if move is not None else None,
+                               principal_variation=[packed_move_to_uci(pv_move) for pv_move in principal_variation], nodes=context.nodes,
+                               statistics=context.statistics.as_dict(),
+                               lines=[(line_value, packed_move_to_pos_move(line_move), [packed_move_to_uci(pv_move) for pv_move in line_pv])
+                                      for line_value, line_move, line_pv in context.lines])
 
-    
 
 # if __name__ == "__main__":
 #     from openings import opening_explorer
@@ -0,0 +1,119 @@
+"""Piece values and piece square tables for evaluation
+game.Game keeps its scores up to date from the per square tables at the bottom as pieces move, so engine.evaluate doesn't
+have to look at the board. these are only read after import, nothing should write to them"""
+import piece
+
+piece_values = {
+    piece.PAWN: 100,
+    piece.KNIGHT: 320,
+    piece.BISHOP: 330,
+    piece.ROOK: 500,
+    piece.QUEEN: 900,
+    piece.KING: 20000
+}
+piece_square_tables = {
+    piece.PAWN: [
+        [0, 0, 0, 0, 0, 0, 0, 0],
+        [50, 50, 50, 50, 50, 50, 50, 50],
+        [10, 10, 20, 30, 30, 20, 10, 10],
+        [5, 5, 10, 25, 25, 10, 5, 5],
+        [0, 0, 0, 20, 20, 0, 0, 0],
+        [5, -5, -10, 0, 0, -10, -5, 5],
+        [5, 10, 10, -20, -20, 10, 10, 5],
+        [0, 0, 0, 0, 0, 0, 0, 0]
+    ],
+    piece.KNIGHT: [
+        [-50, -40, -30, -30, -30, -30, -40, -50],
+        [-40, -20, 0, 0, 0, 0, -20, -40],
+        [-30, 0, 10, 15, 15, 10, 0, -30],
+        [-30, 5, 15, 20, 20, 15, 5, -30],
+        [-30, 0, 15, 20, 20, 15, 0, -30],
+        [-30, 5, 10, 15, 15, 10, 5, -30],
+        [-40, -20, 0, 5, 5, 0, -20, -40],
+        [-50, -40, -30, -30, -30, -30, -40, -50]
+    ],
+    piece.BISHOP: [
+        [-20, -10, -10, -10, -10, -10, -10, -20],
+        [-10, 0, 0, 0, 0, 0, 0, -10],
+        [-10, 0, 5, 10, 10, 5, 0, -10],
+        [-10, 5, 5, 10, 10, 5, 5, -10],
+        [-10, 0, 10, 10, 10, 10, 0, -10],
+        [-10, 10, 10, 10, 10, 10, 10, -10],
+        [-10, 5, 0, 0, 0, 0, 5, -10],
+        [-20, -10, -10, -10, -10, -10, -10, -20]
+    ],
+    piece.ROOK: [
+        [0, 0, 0, 0, 0, 0, 0, 0],
+        [5, 10, 10, 10, 10, 10, 10, 5],
+        [-5, 0, 0, 0, 0, 0, 0, -5],
+        [-5, 0, 0, 0, 0, 0, 0, -5],
+        [-5, 0, 0, 0, 0, 0, 0, -5],
+        [-5, 0, 0, 0, 0, 0, 0, -5],
+        [-5, 0, 0, 0, 0, 0, 0, -5],
+        [0, 0, 0, 5, 5, 0, 0, 0]
+    ],
+    piece.QUEEN: [
+        [-20, -10, -10, -5, -5, -10, -10, -20],
+        [-10, 0, 0, 0, 0, 0, 0, -10],
+        [-10, 0, 5, 5, 5, 5, 0, -10],
+        [-5, 0, 5, 5, 5, 5, 0, -5],
+        [0, 0, 5, 5, 5, 5, 0, -5],
+        [-10, 5, 5, 5, 5, 5, 0, -10],
+        [-10, 0, 5, 0, 0, 0, 0, -10],
+        [-20, -10, -10, -5, -5, -10, -10, -20]
+    ],
+    piece.KING: [
+        [-30, -40, -40, -50, -50, -40, -40, -30],
+        [-30, -40, -40, -50, -50, -40, -40, -30],
+        [-30, -40, -40, -50, -50, -40, -40, -30],
+        [-30, -40, -40, -50, -50, -40, -40, -30],
+        [-20, -30, -30, -40, -40, -30, -30, -20],
+        [-10, -20, -20, -20, -20, -20, -20, -10],
+        [20, 20, 0, 0, 0, 0, 20, 20],
+        [20, 30, 10, 0, 0, 10, 30, 20]
+    ]
+}
+EARLY_GAME_KING = [
+    [-30, -40, -40, -50, -50, -40, -40, -30],
+    [-30, -40, -40, -50, -50, -40, -40, -30],
+    [-30, -40, -40, -50, -50, -40, -40, -30],
+    [-30, -40, -40, -50, -50, -40, -40, -30],
+    [-20, -30, -30, -40, -40, -30, -30, -20],
+    [-10, -20, -20, -20, -20, -20, -20, -10],
+    [20, 20, 0, 0, 0, 0, 20, 20],
+    [20, 60, 90, 0, 0, 10, 110, 20]
+]
+LATE_GAME_KING = [
+    [-50, -40, -30, -20, -20, -30, -40, -50],
+    [-30, -20, -10, 0, 0, -10, -20, -30],
+    [-30, -10, 20, 30, 30, 20, -10, -30],
+    [-30, -10, 30, 40, 40, 30, -10, -30],
+    [-30, -10, 30, 40, 40, 30, -10, -30],
+    [-30, -10, 20, 30, 30, 20, -10, -30],
+    [-30, -30, 0, 0, 0, 0, -30, -30],
+    [-50, -30, -30, -30, -30, -30, -30, -50]
+]
+
+# game phase, from TOTAL_PHASE with every piece on the board down to 0 with only kings and pawns
+# the king tables are blended between EARLY_GAME_KING and LATE_GAME_KING by it
+PHASE_WEIGHTS = [0, 1, 1, 2, 4, 0, 0, 0] * 2  # indexed by the piece int
+TOTAL_PHASE = 24
+
+def square_score(piece_int: int, square: int, king_table: list[list[int]]) -> int:
+    """value of a piece on a square, positive for white and negative for black, tables are from white's side at the top"""
+    piece_type, white = piece.get_piece_attrs(piece_int)
+    table = king_table if piece_type == piece.KING else piece_square_tables[piece_type]
+    i, j = divmod(square, 8)
+    if white:
+        return piece_values[piece_type] + table[7 - i][j]
+    return -piece_values[piece_type] - table[i][j]
+
+# [piece int][square], unused piece ints are left as zeros
+OPENING_SQUARE_SCORES = [[0] * 64 for _ in range(16)]
+ENDGAME_SQUARE_SCORES = [[0] * 64 for _ in range(16)]
+for piece_type in piece_values:
+    for white in (False, True):
+        piece_int = piece.generate_piece(piece_type, white)
+        for square in range(64):
+            OPENING_SQUARE_SCORES[piece_int][square] = square_score(piece_int, square, EARLY_GAME_KING)
+            ENDGAME_SQUARE_SCORES[piece_int][square] = square_score(piece_int, square, LATE_GAME_KING)
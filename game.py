@@ -1,40 +1,248 @@
 import piece
+import bitboard
+import zobrist
+from evaluation_tables import OPENING_SQUARE_SCORES, ENDGAME_SQUARE_SCORES, PHASE_WEIGHTS
+from move_cache import legal_moves_cache, pseudo_legal_moves_cache
+from bitboard import SQUARE_TO_POS
 from utils_and_constants import *
-from functools import lru_cache
 
 w_or_b = {"w": True, "b": False}
 letter_to_class = {"p": piece.PAWN, "n": piece.KNIGHT, "b": piece.BISHOP, "r": piece.ROOK, "q": piece.QUEEN, "k": piece.KING}
 piece_to_letter = {piece.PAWN: "p", piece.KNIGHT: "n", piece.BISHOP: "b", piece.ROOK: "r", piece.QUEEN: "q", piece.KING: "k"}
+# fen letter <-> piece int, both colours
+fen_letter_to_piece = {letter: piece.generate_piece(piece_type, False) for letter, piece_type in letter_to_class.items()}
+fen_letter_to_piece.update({letter.upper(): piece.generate_piece(piece_type, True) for letter, piece_type in letter_to_class.items()})
+piece_to_fen_letter = {item: letter for letter, item in fen_letter_to_piece.items()}
+
+WHITE_KING = piece.generate_piece(piece.KING, True)
+BLACK_KING = piece.generate_piece(piece.KING, False)
+
+# castling rights are stored as bits of one int, in the same KQkq order as fens
+WHITE_KINGSIDE = 0b0001
+WHITE_QUEENSIDE = 0b0010
+BLACK_KINGSIDE = 0b0100
+BLACK_QUEENSIDE = 0b1000
+CORNER_CASTLING_RIGHTS = {bitboard.H1: WHITE_KINGSIDE, bitboard.A1: WHITE_QUEENSIDE, bitboard.H8: BLACK_KINGSIDE, bitboard.A8: BLACK_QUEENSIDE}
+
+PROMOTION_PIECES = [piece.QUEEN, piece.KNIGHT, piece.ROOK, piece.BISHOP]
+
+# which moves generate_legal_moves_uncached makes, tactical moves are captures (including en passant) and promotions
+ALL_MOVES = 0
+TACTICAL_MOVES = 1
+QUIET_MOVES = 2
+
+# returned by make_move and given back to unmake_move:
+# (packed move, moved piece, captured piece, castling, en passant square, half moves count, full moves count, zobrist key)
+Undo = tuple[int, int, int | None, int, int | None, int, int, int]
+
+CASTLING_STRINGS = ["".join(letter for letter, right in zip("KQkq", (WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE)) if castling & right) or "-"
+                    for castling in range(16)]
+CASTLING_FROM_LETTER = {"K": WHITE_KINGSIDE, "Q": WHITE_QUEENSIDE, "k": BLACK_KINGSIDE, "q": BLACK_QUEENSIDE, "-": 0}
+SQUARE_NAMES = [pos_to_notation(square_to_pos(square)) for square in range(64)]
+SQUARE_FROM_NAME = {name: square for square, name in enumerate(SQUARE_NAMES)}
+
+# squares, white to move, castling bits, en passant square, half moves count, full moves count
+State = tuple[list[int | None], bool, int, int | None, int, int]
+
+def parse_fen_board(fboard: str) -> list[int | None]:
+    """piece placement field of a fen straight to a 64 square mailbox, raises ValueError if it's malformed"""
+    ranks = fboard.split("/")
+    if len(ranks) != 8:
+        raise ValueError(f"fen board needs 8 ranks, not {len(ranks)}: {fboard}")
+    squares: list[int | None] = [None] * 64
+    for rank_index, rank in enumerate(ranks):
+        square = (7 - rank_index) * 8  # fens go top down
+        end = square + 8
+        for letter in rank:
+            if letter in "12345678":
+                square += ord(letter) - 48
+            else:
+                if square >= end or letter not in fen_letter_to_piece:
+                    raise ValueError(f"bad rank in fen board: {rank}")
+                squares[square] = fen_letter_to_piece[letter]
+                square += 1
+        if square != end:
+            raise ValueError(f"rank doesn't have 8 squares in fen board: {rank}")
+    return squares
+
+def parse_fen(fen: str) -> State:
+    """split a fen into the raw state Game.from_state takes, raises ValueError if it's malformed
+    only the board is required, the other fields default like they would at the start of a game"""
+    fields = fen.split()
+    if not fields:
+        raise ValueError("empty fen")
+    return (parse_fen_board(fields[0]), *parse_fen_fields(fields[1:]))
+
+def parse_fen_fields(fields: list[str]) -> tuple[bool, int, int | None, int, int]:
+    """the fields after the board, any that are missing get their start of game values"""
+    white_move = True
+    castling = 0
+    en_passant_square = None
+    half_moves_count = 0
+    full_moves_count = 1
+    if len(fields) > 0:
+        if fields[0] not in w_or_b:
+            raise ValueError(f"side to move must be w or b, not {fields[0]}")
+        white_move = w_or_b[fields[0]]
+    if len(fields) > 1:
+        for letter in fields[1]:
+            if letter not in CASTLING_FROM_LETTER:
+                raise ValueError(f"bad castling rights in fen: {fields[1]}")
+            castling |= CASTLING_FROM_LETTER[letter]
+    if len(fields) > 2 and fields[2] != "-":
+        en_passant_square = SQUARE_FROM_NAME.get(fields[2])
+        if en_passant_square is None or en_passant_square // 8 not in (2, 5):
+            raise ValueError(f"bad en passant square in fen: {fields[2]}")
+    if len(fields) > 3:
+        if not fields[3].isdigit():
+            raise ValueError(f"half moves count must be a number, not {fields[3]}")
+        half_moves_count = int(fields[3])
+    if len(fields) > 4:
+        if not fields[4].isdigit():
+            raise ValueError(f"full moves count must be a number, not {fields[4]}")
+        full_moves_count = int(fields[4])
+    return white_move, castling, en_passant_square, half_moves_count, full_moves_count
 
 class Game:
     def __init__(self, fen: str = DEFAULT_FEN):
-        self.en_passant_square = None
-        self.half_moves_count = 0
-        self.full_moves_count = 1  # in case fen doesn't have these, this might not be accurate but shouldn't affect anything too much
-        try:
-            fen_list = fen.strip().split(" ")
-            self.board: list[list[int | None]] = self.board_from_fen(fen_list.pop(0))  # starts in bottom left in rows, going up
-            self.white_move = w_or_b[fen_list.pop(0)]
-            fcastling = fen_list.pop(0)
-            self.castling_rights = ["K" in fcastling, "Q" in fcastling, "k" in fcastling, "q" in fcastling]
-            fEn_passant = fen_list.pop(0)
-            self.en_passant_square: tuple[int, int] | None = notation_to_pos(fEn_passant) if fEn_passant != "-" else None
-            self.half_moves_count = int(fen_list.pop(0))
-            self.full_moves_count = int(fen_list.pop(0))
-        except IndexError:
-            pass
-    
+        self.set_state(*parse_fen(fen))
+
+    @classmethod
+    def from_state(cls, squares: list[int | None], white_move: bool = True, castling: int = 0, en_passant_square: int | None = None,
+                   half_moves_count: int = 0, full_moves_count: int = 1) -> 'Game':
+        """build a game from raw state without going through a fen"""
+        game = cls.__new__(cls)
+        game.set_state(squares, white_move, castling, en_passant_square, half_moves_count, full_moves_count)
+        return game
+
+    @classmethod
+    def from_fens(cls, fens, skip_invalid: bool = False) -> list['Game']:
+        """build a game from every fen in an iterable, for loading opening books and analysis batches
+        boards that repeat (the same position with different move counts) are only parsed once
+        raises ValueError on the first fen that doesn't parse or doesn't have one king each, unless skip_invalid"""
+        games = []
+        parsed_boards: dict[str, list[int | None]] = {}
+        for index, fen in enumerate(fens):
+            try:
+                fields = fen.split()
+                if not fields:
+                    raise ValueError("empty fen")
+                fboard = fields[0]
+                squares = parsed_boards.get(fboard)
+                if squares is None:
+                    squares = parse_fen_board(fboard)
+                    if squares.count(WHITE_KING) != 1 or squares.count(BLACK_KING) != 1:
+                        raise ValueError(f"fen board needs one king each: {fboard}")
+                    parsed_boards[fboard] = squares
+                state = parse_fen_fields(fields[1:])
+            except ValueError as e:
+                if skip_invalid:
+                    continue
+                raise ValueError(f"fen {index}: {e}") from e
+            games.append(cls.from_state(squares, *state))
+        return games
+
+    def set_state(self, squares: list[int | None], white_move: bool, castling: int, en_passant_square: int | None,
+                  half_moves_count: int, full_moves_count: int):
+        # the position is stored as bitboards, one per piece (indexed by the piece int, see piece.generate_piece)
+        # and one occupancy mask per colour (indexed by white: bool), with squares as a mailbox for lookups
+        self.squares: list[int | None] = [None] * 64
+        self.bitboards: list[int] = [0] * 16
+        self.occupancy: list[int] = [0, 0]
+        # kept up to date by put_piece and remove_piece so nothing has to scan the board to count pieces or find kings
+        self.piece_counts: list[int] = [0] * 16  # indexed by the piece int like bitboards
+        self.number_of_pieces = 0
+        self.king_squares: list[int | None] = [None, None]  # indexed by white
+        # white positive material and piece square scores with the early and late game king tables, and the phase to blend them by
+        self.opening_score = 0
+        self.endgame_score = 0
+        self.phase = 0
+        self.white_move = white_move
+        self.castling = castling
+        self.en_passant_square = en_passant_square
+        self.half_moves_count = half_moves_count
+        self.full_moves_count = full_moves_count  # fens without these default to the start of a game, which shouldn't affect anything too much
+        # the same bookkeeping as put_piece, done inline since this is the hot path for bulk loading
+        self.hash_key = zobrist.CASTLING_KEYS[castling]
+        if white_move:
+            self.hash_key ^= zobrist.WHITE_TO_MOVE_KEY
+        if en_passant_square is not None:
+            self.hash_key ^= zobrist.EN_PASSANT_KEYS[en_passant_square]
+        for square, item in enumerate(squares):
+            if item is not None:
+                bb = 1 << square
+                self.squares[square] = item
+                self.bitboards[item] |= bb
+                self.occupancy[item >> 3] |= bb
+                self.piece_counts[item] += 1
+                self.number_of_pieces += 1
+                if item & 7 == piece.KING:
+                    self.king_squares[item >> 3] = square
+                self.opening_score += OPENING_SQUARE_SCORES[item][square]
+                self.endgame_score += ENDGAME_SQUARE_SCORES[item][square]
+                self.phase += PHASE_WEIGHTS[item]
+                self.hash_key ^= zobrist.PIECE_KEYS[item][square]
+
     def __hash__(self) -> int:
-        return hash(self.get_fen())
-    
+        return self.hash_key
+
     def __eq__(self, other: 'Game') -> bool:
-        return self.get_fen() == other.get_fen()
+        return self.hash_key == other.hash_key
+
+    def zobrist_key(self) -> int:
+        """64 bit key for the pieces, side to move, castling rights and en passant square
+        kept up to date by make_move and unmake_move, so it is free to read"""
+        return self.hash_key
+
+    def compute_hash_key(self) -> int:
+        """build the zobrist key from scratch, make_move updates it incrementally instead"""
+        key = zobrist.CASTLING_KEYS[self.castling]
+        for square, item in enumerate(self.squares):
+            if item is not None:
+                key ^= zobrist.PIECE_KEYS[item][square]
+        if self.white_move:
+            key ^= zobrist.WHITE_TO_MOVE_KEY
+        if self.en_passant_square is not None:
+            key ^= zobrist.EN_PASSANT_KEYS[self.en_passant_square]
+        return key
+
+    @property
+    def board(self) -> list[list[int | None]]:
+        """list board view of the bitboards, starts in bottom left in rows, going up"""
+        return [self.squares[i:i + 8] for i in range(0, 64, 8)]
+
+    @board.setter
+    def board(self, board: list[list[int | None]]):
+        self.squares = [None] * 64
+        self.bitboards = [0] * 16
+        self.occupancy = [0, 0]
+        self.piece_counts = [0] * 16
+        self.number_of_pieces = 0
+        self.king_squares = [None, None]
+        self.opening_score = 0
+        self.endgame_score = 0
+        self.phase = 0
+        for i, rank in enumerate(board):
+            for j, item in enumerate(rank):
+                if item is not None:
+                    self.put_piece(i * 8 + j, item)
+        self.hash_key = self.compute_hash_key()
+
+    @property
+    def castling_rights(self) -> list[bool]:
+        """[K, Q, k, q] view of the castling bits"""
+        return [bool(self.castling & right) for right in (WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE)]
+
+    @castling_rights.setter
+    def castling_rights(self, castling_rights: list[bool]):
+        self.castling = sum(right for right, allowed in zip((WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE), castling_rights) if allowed)
+        self.hash_key = self.compute_hash_key()
 
     def get_game_state(self):
         if self.half_moves_count >= 100:
             return GameState.DRAW
-        if len(self.get_legal_moves_with_check_check()) == 0:
-            if self.not_in_check():
+        if len(self.generate_legal_moves()) == 0:
+            if self.in_check():
                 return GameState.BLACK_WINS if self.white_move else GameState.WHITE_WINS
             else:
                 return GameState.DRAW
@@ -42,115 +250,111 @@ class Game:
             return GameState.WHITE_TURN
         else:
             return GameState.BLACK_TURN
-    
+
     def get_full_moves_count(self):
         return self.full_moves_count
-    
+
     def get_white_move(self):
         return self.white_move
-    
+
     def get_board(self):
         return self.board
-    
+
     def get_castling_rights(self):
         return self.castling_rights
 
     def copy(self) -> 'Game':
-        copy = Game()
-        copy.board = [rank[:] for rank in self.board]
+        copy = Game.__new__(Game)
+        copy.squares = self.squares[:]
+        copy.bitboards = self.bitboards[:]
+        copy.occupancy = self.occupancy[:]
+        copy.piece_counts = self.piece_counts[:]
+        copy.number_of_pieces = self.number_of_pieces
+        copy.king_squares = self.king_squares[:]
+        copy.opening_score = self.opening_score
+        copy.endgame_score = self.endgame_score
+        copy.phase = self.phase
         copy.white_move = self.white_move
-        copy.castling_rights = self.castling_rights[:]
+        copy.castling = self.castling
         copy.en_passant_square = self.en_passant_square
         copy.half_moves_count = self.half_moves_count
         copy.full_moves_count = self.full_moves_count
+        copy.hash_key = self.hash_key
         return copy
-    
+
+    def get_state(self) -> State:
+        """raw state for Game.from_state, compact and cheap to send to another process"""
+        return self.squares[:], self.white_move, self.castling, self.en_passant_square, self.half_moves_count, self.full_moves_count
+
     def king_taken(self) -> bool:
-        count = 0
-        for rank in self.board:
-            for item in rank:
-                if item is not None:
-                    piece_type = piece.get_piece_type(item)
-                    if piece_type == piece.KING:
-                        count += 1
-        return count != 2       
-    
+        return self.king_squares[0] is None or self.king_squares[1] is None
+
     def get_piece_from_pos(self, pos: tuple[int, int]) -> int | None:
-        i, j = pos_to_indices(pos)
-        return self.board[i][j]
-    
+        return self.squares[pos_to_square(pos)]
+
     def get_number_of_pieces(self) -> int:
-        nones = 0
-        for rank in self.board:
-            nones += rank.count(None)
-        return 64 - nones
+        return self.number_of_pieces
+
+    def put_piece(self, square: int, piece_to_put: int):
+        bb = 1 << square
+        self.squares[square] = piece_to_put
+        self.bitboards[piece_to_put] |= bb
+        self.occupancy[piece_to_put >> 3] |= bb
+        self.piece_counts[piece_to_put] += 1
+        self.number_of_pieces += 1
+        if piece_to_put & 7 == piece.KING:
+            self.king_squares[piece_to_put >> 3] = square
+        self.opening_score += OPENING_SQUARE_SCORES[piece_to_put][square]
+        self.endgame_score += ENDGAME_SQUARE_SCORES[piece_to_put][square]
+        self.phase += PHASE_WEIGHTS[piece_to_put]
+        self.hash_key ^= zobrist.PIECE_KEYS[piece_to_put][square]
+
+    def remove_piece(self, square: int) -> int | None:
+        removed = self.squares[square]
+        if removed is not None:
+            bb = 1 << square
+            self.squares[square] = None
+            self.bitboards[removed] ^= bb
+            self.occupancy[removed >> 3] ^= bb
+            self.piece_counts[removed] -= 1
+            self.number_of_pieces -= 1
+            if removed & 7 == piece.KING and self.king_squares[removed >> 3] == square:
+                self.king_squares[removed >> 3] = None
+            self.opening_score -= OPENING_SQUARE_SCORES[removed][square]
+            self.endgame_score -= ENDGAME_SQUARE_SCORES[removed][square]
+            self.phase -= PHASE_WEIGHTS[removed]
+            self.hash_key ^= zobrist.PIECE_KEYS[removed][square]
+        return removed
 
     def board_from_fen(self, fboard: str) -> list[list[int | None]]:
-        board: list[list[int | None]] = []
-        for rank in fboard.split("/"):
-            row = []
-            for file in rank:
-                if file in "12345678":
-                    for _ in range(int(file)):
-                        row.append(None)
-                else:
-                    white = file.isupper()
-                    row.append(piece.generate_piece(letter_to_class[file.lower()], white))
-            board.append(row)
+        squares = parse_fen_board(fboard)
+        return [squares[i:i + 8] for i in range(0, 64, 8)]
 
-        board = board[::-1]  # fens go top down, we want bottom up
-        return board
-                       
     def get_fen(self) -> str:
         """return fen string of current game state"""
-        fen = self.get_truncated_fen()
-        fen += " "
-        if self.en_passant_square:
-            fen += pos_to_notation(self.en_passant_square)
-        else:
-            fen += "-"
-        fen += " "
-        fen += str(self.half_moves_count)
-        fen += " "
-        fen += str(self.full_moves_count)
-        return fen
+        en_passant = SQUARE_NAMES[self.en_passant_square] if self.en_passant_square is not None else "-"
+        return f"{self.get_truncated_fen()} {en_passant} {self.half_moves_count} {self.full_moves_count}"
 
     def get_truncated_fen(self) -> str:
         """return fen string of current game state without ep, half moves, and full moves
         this is split since openings often dont have these"""
-        fen = ""
-        blank_count = 0
-        for rank in self.board[::-1]:
-            for item in rank:
+        ranks = []
+        squares = self.squares
+        for rank_start in range(56, -1, -8):
+            rank = ""
+            blank_count = 0
+            for item in squares[rank_start:rank_start + 8]:
                 if item is None:
                     blank_count += 1
                 else:
-                    if blank_count > 0:
-                        fen += str(blank_count)
+                    if blank_count:
+                        rank += str(blank_count)
                         blank_count = 0
-                    piece_type, white = piece.get_piece_attrs(item)
-                    fen += piece_to_letter[piece_type].upper() if white else piece_to_letter[piece_type]
-            if blank_count > 0:
-                fen += str(blank_count)
-                blank_count = 0
-            fen += "/"
-        fen = fen[:-1]  # remove last slash
-        fen += " "
-        fen += "w" if self.white_move else "b"
-        fen += " "
-        castling = ""
-        if self.castling_rights[0]:
-            castling += "K"
-        if self.castling_rights[1]:
-            castling += "Q"
-        if self.castling_rights[2]:
-            castling += "k"
-        if self.castling_rights[3]:
-            castling += "q"
-        if castling == "":
-            castling = "-"
-        fen += castling
-        return fen
+                    rank += piece_to_fen_letter[item]
+            if blank_count:
+                rank += str(blank_count)
+            ranks.append(rank)
+        return f"{'/'.join(ranks)} {'w' if self.white_move else 'b'} {CASTLING_STRINGS[self.castling]}"
 
     def legal_move(self, start_pos: tuple[int, int], end_pos: tuple[int, int]) -> bool:
         start_piece = self.get_piece_from_pos(start_pos)
@@ -158,283 +362,477 @@ class Game:
         piece_type = piece.get_piece_type(start_piece)
         legal_moves = PIECEWISE_LEGAL_MOVES[piece_type](self, start_pos)
         return (start_pos, end_pos) in legal_moves
-    
-    @lru_cache(maxsize=512)
+
     def get_legal_moves(self) -> list[tuple[tuple[int, int], tuple[int, int]]]:
-        """return list of legal moves in (start_pos, end_pos) format"""
+        """return list of legal moves in (start_pos, end_pos) format, cached by zobrist key"""
+        legal_moves = pseudo_legal_moves_cache.get(self.hash_key)
+        if legal_moves is None:
+            legal_moves = tuple(self.get_legal_moves_uncached())
+            pseudo_legal_moves_cache.put(self.hash_key, legal_moves)
+        return list(legal_moves)
+
+    def get_legal_moves_uncached(self) -> list[tuple[tuple[int, int], tuple[int, int]]]:
         legal_moves = []
-        for i, rank in enumerate(self.board):
-            for j, item in enumerate(rank):
-                if item is not None:
-                    piece_type, white = piece.get_piece_attrs(item)
-                    if white != self.white_move:
-                        continue
-                    start_pos = indices_to_pos(i, j)
-                    legal_moves += PIECEWISE_LEGAL_MOVES[piece_type](self, start_pos)
+        own_pieces = self.occupancy[self.white_move]
+        while own_pieces:
+            lsb = own_pieces & -own_pieces
+            own_pieces ^= lsb
+            start_square = lsb.bit_length() - 1
+            piece_type = piece.get_piece_type(self.squares[start_square])  # type: ignore (occupied squares aren't None)
+            legal_moves += PIECEWISE_LEGAL_MOVES[piece_type](self, SQUARE_TO_POS[start_square])
         return legal_moves
-    
+
     def not_in_check_after_move(self, start_pos: tuple[int, int], end_pos: tuple[int, int]) -> bool:
-        game_copy = self.copy()
-        game_copy.make_move(start_pos, end_pos)
-        return game_copy.not_in_check()
-    
+        undo = self.make_move(start_pos, end_pos)
+        not_in_check = self.not_in_check()
+        self.unmake_move(undo)
+        return not_in_check
+
     def not_in_check(self) -> bool:
-        for move in self.get_legal_moves():
-            response_destination = self.get_piece_from_pos(move[1])
-            if response_destination is not None:
-                piece_type = piece.get_piece_type(response_destination)
-                if piece_type == piece.KING:
-                    return False
-        return True
-    
+        """whether the side to move can't take the other king"""
+        king_bb = self.bitboards[piece.generate_piece(piece.KING, not self.white_move)]
+        if not king_bb:
+            return True
+        return not self.is_square_attacked(king_bb.bit_length() - 1, self.white_move)
+
     def get_legal_moves_with_check_check(self) -> list[tuple[tuple[int, int], tuple[int, int]]]:
-        legal_moves = []
-        for move in self.get_legal_moves():
-            if self.not_in_check_after_move(*move):
-                legal_moves.append(move)
-        return legal_moves
-    
+        """strictly legal moves in (start_pos, end_pos) format, promotions are only listed once"""
+        return [packed_move_to_pos_move(move) for move in self.generate_legal_moves() if move_promotion_piece(move) in (0, piece.QUEEN)]
+
     def legal_moves_from_start_pos(self, start_pos: tuple[int, int]) -> list[tuple[tuple[int, int], tuple[int, int]]]:
         start_piece = self.get_piece_from_pos(start_pos)
         assert start_piece is not None
         piece_type = piece.get_piece_type(start_piece)
         legal_moves = PIECEWISE_LEGAL_MOVES[piece_type](self, start_pos)
         return legal_moves
-        
+
     def legal_moves_from_start_pos_with_check_check(self, start_pos: tuple[int, int]) -> list[tuple[tuple[int, int], tuple[int, int]]]:
-        legal_moves = self.legal_moves_from_start_pos(start_pos)
-        for move in legal_moves[:]:  # Need to use copy as items might be removed from list
-            if not self.not_in_check_after_move(*move):
-                legal_moves.remove(move)
-        return legal_moves
-    
+        return [move for move in self.get_legal_moves_with_check_check() if move[0] == start_pos]
+
     def legal_move_with_check_check(self, start_pos: tuple[int, int], end_pos: tuple[int, int]) -> bool:
-        start_piece = self.get_piece_from_pos(start_pos)
-        assert start_piece is not None
-        piece_type = piece.get_piece_type(start_piece)
-        legal_moves = PIECEWISE_LEGAL_MOVES[piece_type](self, start_pos)
-        for move in legal_moves[:]:  # Need to use copy as items might be removed from list
-            if not self.not_in_check_after_move(*move):
-                legal_moves.remove(move)
-        return (start_pos, end_pos) in legal_moves
-    
-    def get_pawn_moves(self, start_pos: tuple[int, int]) -> list[tuple[tuple[int, int], tuple[int, int]]]:
+        return (start_pos, end_pos) in self.get_legal_moves_with_check_check()
+
+    def attackers_to(self, square: int, by_white: bool, occupied: int) -> int:
+        """bitboard of by_white's pieces attacking square, with sliders blocked by occupied rather than the real board"""
+        colour = piece.WHITE if by_white else piece.BLACK
+        bitboards = self.bitboards
+        queens = bitboards[piece.QUEEN + colour]
+        return ((bitboard.KNIGHT_ATTACKS[square] & bitboards[piece.KNIGHT + colour])
+                | (bitboard.KING_ATTACKS[square] & bitboards[piece.KING + colour])
+                | (bitboard.PAWN_ATTACKS[not by_white][square] & bitboards[piece.PAWN + colour])
+                | (bitboard.bishop_attacks(square, occupied) & (bitboards[piece.BISHOP + colour] | queens))
+                | (bitboard.rook_attacks(square, occupied) & (bitboards[piece.ROOK + colour] | queens)))
+
+    def is_square_attacked(self, square: int, by_white: bool) -> bool:
+        """whether any of by_white's pieces attack square, cheapest lookups first so most squares return early"""
+        colour = piece.WHITE if by_white else piece.BLACK
+        bitboards = self.bitboards
+        if bitboard.PAWN_ATTACKS[not by_white][square] & bitboards[piece.PAWN + colour]:
+            return True
+        if bitboard.KNIGHT_ATTACKS[square] & bitboards[piece.KNIGHT + colour]:
+            return True
+        if bitboard.KING_ATTACKS[square] & bitboards[piece.KING + colour]:
+            return True
+        queens = bitboards[piece.QUEEN + colour]
+        occupied = self.occupancy[0] | self.occupancy[1]
+        diagonal_sliders = bitboards[piece.BISHOP + colour] | queens
+        if diagonal_sliders and bitboard.bishop_attacks(square, occupied) & diagonal_sliders:
+            return True
+        straight_sliders = bitboards[piece.ROOK + colour] | queens
+        return bool(straight_sliders and bitboard.rook_attacks(square, occupied) & straight_sliders)
+
+    def in_check(self) -> bool:
+        """whether the side to move's king is attacked, unlike not_in_check which looks at the other king"""
+        king_bb = self.bitboards[piece.generate_piece(piece.KING, self.white_move)]
+        if not king_bb:
+            return False
+        return self.is_square_attacked(king_bb.bit_length() - 1, not self.white_move)
+
+    def generate_legal_moves(self) -> list[int]:
+        """return strictly legal packed moves, see encode_move in utils_and_constants
+        cached by zobrist key, the list is a fresh copy so callers can sort it"""
+        legal_moves = legal_moves_cache.get(self.hash_key)
+        if legal_moves is None:
+            legal_moves = tuple(self.generate_legal_moves_uncached())
+            legal_moves_cache.put(self.hash_key, legal_moves)
+        return list(legal_moves)
+
+    def generate_legal_captures(self) -> list[int]:
+        """strictly legal captures and promotions, for quiescence search, not cached since they're rarely asked for twice"""
+        return self.generate_legal_moves_uncached(TACTICAL_MOVES)
+
+    def generate_legal_quiet_moves(self) -> list[int]:
+        """strictly legal moves that aren't captures or promotions, including castling"""
+        return self.generate_legal_moves_uncached(QUIET_MOVES)
+
+    def is_legal_move(self, move: int) -> bool:
+        """whether a packed move (flags and all) is strictly legal here, only generating moves for the piece it starts on
+        for checking moves remembered from other positions, like hash moves and killers"""
+        start_square = move & 63
+        if not self.occupancy[self.white_move] >> start_square & 1:
+            return False
+        return move in self.generate_legal_moves_uncached(ALL_MOVES, 1 << start_square)
+
+    def generate_legal_moves_uncached(self, stage: int = ALL_MOVES, start_mask: int = bitboard.FULL) -> list[int]:
+        """generate_legal_moves without the cache, stage picks all moves, only tactical moves or only quiet moves
+        and start_mask limits which squares moves can start from
+        checkers and pinned pieces are found once, then every piece's destinations are masked by them
+        rather than trying each move and looking for a reply that takes the king"""
+        white = self.white_move
+        colour = piece.WHITE if white else piece.BLACK
+        bitboards = self.bitboards
+        own = self.occupancy[white]
+        enemy = self.occupancy[not white]
+        occupied = own | enemy
+        empty = ~occupied & bitboard.FULL
+        if stage == TACTICAL_MOVES:
+            target_mask = enemy
+            pawn_target_mask = enemy | bitboard.RANK_1 | bitboard.RANK_8
+        elif stage == QUIET_MOVES:
+            target_mask = empty
+            pawn_target_mask = empty & ~(bitboard.RANK_1 | bitboard.RANK_8)
+        else:
+            target_mask = ~own & bitboard.FULL
+            pawn_target_mask = bitboard.FULL
+        king_bb = bitboards[piece.KING + colour]
+        king_square = king_bb.bit_length() - 1
+        move_king = king_bb & start_mask
         legal_moves = []
-        start_piece = self.get_piece_from_pos(start_pos)
+        checkers = 0
+        check_mask = bitboard.FULL  # squares that capture the checker or block its line
+        pin_masks: dict[int, int] = {}  # pinned square -> the line it can still move along
+
+        if king_bb:  # nothing can be pinned or in check without a king
+            # the king can't stay on a line it is being checked along, so look through it when testing its destinations
+            if move_king:
+                for end_square in bitboard.squares_of(bitboard.KING_ATTACKS[king_square] & target_mask):
+                    if not self.attackers_to(end_square, not white, occupied ^ king_bb):
+                        legal_moves.append(king_square | (end_square << 6) | (MOVE_CAPTURE if enemy >> end_square & 1 else 0))
+
+            checkers = self.attackers_to(king_square, not white, occupied)
+            if checkers.bit_count() > 1:
+                return legal_moves  # only the king can get out of double check
+            if checkers:
+                check_mask = checkers
+            enemy_colour = piece.BLACK if white else piece.WHITE
+            enemy_queens = bitboards[piece.QUEEN + enemy_colour]
+            for directions, sliders in ((bitboard.ROOK_DIRECTIONS, bitboards[piece.ROOK + enemy_colour] | enemy_queens),
+                                        (bitboard.BISHOP_DIRECTIONS, bitboards[piece.BISHOP + enemy_colour] | enemy_queens)):
+                if not sliders:
+                    continue
+                for direction in directions:
+                    ray = bitboard.ray_attacks(king_square, occupied, direction)
+                    if ray & checkers & sliders:
+                        check_mask = ray
+                    blocker = ray & own
+                    if blocker:
+                        ray_behind = bitboard.ray_attacks(king_square, occupied ^ blocker, direction)
+                        if ray_behind & sliders:
+                            pin_masks[blocker.bit_length() - 1] = ray_behind
+
+            if not checkers and move_king and stage != TACTICAL_MOVES:
+                legal_moves += self.get_castling_moves(king_square, white, occupied)
+
+        pieces = (own ^ king_bb) & start_mask
+        while pieces:
+            lsb = pieces & -pieces
+            pieces ^= lsb
+            start_square = lsb.bit_length() - 1
+            piece_type = piece.get_piece_type(self.squares[start_square])  # type: ignore (occupied squares aren't None)
+            if piece_type == piece.PAWN:
+                if white:
+                    targets = (lsb << 8) & empty
+                    targets |= ((targets & bitboard.RANK_3) << 8) & empty
+                else:
+                    targets = (lsb >> 8) & empty
+                    targets |= ((targets & bitboard.RANK_6) >> 8) & empty
+                attacks = bitboard.PAWN_ATTACKS[white][start_square]
+                targets = (targets | (attacks & enemy)) & check_mask & pawn_target_mask
+                if start_square in pin_masks:
+                    targets &= pin_masks[start_square]
+                if targets:
+                    self.add_pawn_moves(legal_moves, start_square, targets, enemy)
+                if self.en_passant_square is not None and stage != QUIET_MOVES:
+                    en_passant_bb = 1 << self.en_passant_square
+                    if attacks & en_passant_bb and (not king_bb or self.legal_en_passant(lsb, en_passant_bb, king_square, white, occupied)):
+                        legal_moves.append(start_square | (self.en_passant_square << 6) | MOVE_CAPTURE | MOVE_EN_PASSANT)
+                continue
+            elif piece_type == piece.KNIGHT:
+                targets = bitboard.KNIGHT_ATTACKS[start_square]
+            elif piece_type == piece.BISHOP:
+                targets = bitboard.bishop_attacks(start_square, occupied)
+            elif piece_type == piece.ROOK:
+                targets = bitboard.rook_attacks(start_square, occupied)
+            else:
+                targets = bitboard.queen_attacks(start_square, occupied)
+            targets &= target_mask & check_mask
+            if start_square in pin_masks:
+                targets &= pin_masks[start_square]
+            if targets:
+                self.add_moves(legal_moves, start_square, targets, enemy)
+        return legal_moves
+
+    def add_moves(self, moves: list[int], start_square: int, targets: int, enemy: int):
+        """append a packed move from start_square to each square in the targets bitboard"""
+        while targets:
+            lsb = targets & -targets
+            targets ^= lsb
+            moves.append(start_square | ((lsb.bit_length() - 1) << 6) | (MOVE_CAPTURE if lsb & enemy else 0))
+
+    def add_pawn_moves(self, moves: list[int], start_square: int, targets: int, enemy: int):
+        """like add_moves, but with double push flags and a move for each promotion piece"""
+        while targets:
+            lsb = targets & -targets
+            targets ^= lsb
+            end_square = lsb.bit_length() - 1
+            move = start_square | (end_square << 6) | (MOVE_CAPTURE if lsb & enemy else 0)
+            if end_square >= 56 or end_square < 8:
+                for promotion_piece in PROMOTION_PIECES:
+                    moves.append(move | (promotion_piece << MOVE_PROMOTION_SHIFT))
+            elif end_square - start_square in (16, -16):
+                moves.append(move | MOVE_DOUBLE_PUSH)
+            else:
+                moves.append(move)
+
+    def legal_en_passant(self, start_bb: int, en_passant_bb: int, king_square: int, white: bool, occupied: int) -> bool:
+        """en passant removes two pieces from a line at once, so just check the king against the occupancy after it"""
+        captured_bb = en_passant_bb >> 8 if white else en_passant_bb << 8
+        occupied_after = occupied ^ start_bb ^ captured_bb ^ en_passant_bb
+        return not self.attackers_to(king_square, not white, occupied_after) & ~captured_bb
+
+    def get_castling_moves(self, king_square: int, white: bool, occupied: int) -> list[int]:
+        """castling for a king that isn't in check, none of the squares it passes over or lands on can be attacked"""
+        legal_moves = []
+        if white:
+            start_square, kingside, queenside = 4, WHITE_KINGSIDE, WHITE_QUEENSIDE
+        else:
+            start_square, kingside, queenside = 60, BLACK_KINGSIDE, BLACK_QUEENSIDE
+        if king_square != start_square:
+            return legal_moves
+        if self.castling & kingside and not occupied & (0b11 << (start_square + 1)):
+            if not self.is_square_attacked(start_square + 1, not white) and not self.is_square_attacked(start_square + 2, not white):
+                legal_moves.append(encode_move(start_square, start_square + 2, flags=MOVE_CASTLE))
+        if self.castling & queenside and not occupied & (0b111 << (start_square - 3)):
+            if not self.is_square_attacked(start_square - 1, not white) and not self.is_square_attacked(start_square - 2, not white):
+                legal_moves.append(encode_move(start_square, start_square - 2, flags=MOVE_CASTLE))
+        return legal_moves
+
+    def moves_to_targets(self, start_square: int, targets: int) -> list[tuple[tuple[int, int], tuple[int, int]]]:
+        """turn a bitboard of destination squares into (start_pos, end_pos) moves"""
+        start_pos = SQUARE_TO_POS[start_square]
+        legal_moves = []
+        while targets:
+            lsb = targets & -targets
+            targets ^= lsb
+            legal_moves.append((start_pos, SQUARE_TO_POS[lsb.bit_length() - 1]))
+        return legal_moves
+
+    def own_and_enemy_pieces(self, start_square: int) -> tuple[int, int]:
+        """return occupancy of the piece on start_square's side, then the other side"""
+        white = self.squares[start_square] >> 3  # type: ignore (only called on occupied squares)
+        return self.occupancy[white], self.occupancy[not white]
+
+    def get_pawn_moves(self, start_pos: tuple[int, int]) -> list[tuple[tuple[int, int], tuple[int, int]]]:
+        start_square = pos_to_square(start_pos)
+        start_piece = self.squares[start_square]
         assert start_piece is not None
         piece_type, white = piece.get_piece_attrs(start_piece)
         assert piece_type == piece.PAWN
-        direction = 1 if white else -1
-        ahead = vector_add(start_pos, (0, direction))
-        i, j = pos_to_indices(ahead)
-        if self.board[i][j] is None:
-            legal_moves.append((start_pos, ahead))
-            if (white and start_pos[1] == 2) or (not white and start_pos[1] == 7):
-                ahead2 = vector_add(ahead, (0, direction))
-                i, j = pos_to_indices(ahead2)
-                if self.board[i][j] is None:
-                    legal_moves.append((start_pos, ahead2))
-        for side in [(1, direction), (-1, direction)]:
-            side_pos = vector_add(start_pos, side)
-            i, j = pos_to_indices(side_pos)
-            if 0 <= i < 8 and 0 <= j < 8:
-                side_piece = self.board[i][j]
-                if side_piece is not None:
-                    side_white = piece.get_piece_colour(side_piece)
-                    if side_white != white:
-                        legal_moves.append((start_pos, side_pos))
-                elif side_pos == self.en_passant_square:
-                    legal_moves.append((start_pos, side_pos))
-        return legal_moves
-    
+        bb = 1 << start_square
+        empty = ~(self.occupancy[0] | self.occupancy[1])
+        capturable = self.occupancy[not white]
+        if self.en_passant_square is not None:
+            capturable |= 1 << self.en_passant_square
+        if white:
+            ahead = (bb << 8) & empty
+            ahead |= ((ahead & bitboard.RANK_3) << 8) & empty
+        else:
+            ahead = (bb >> 8) & empty
+            ahead |= ((ahead & bitboard.RANK_6) >> 8) & empty
+        return self.moves_to_targets(start_square, ahead | (bitboard.PAWN_ATTACKS[white][start_square] & capturable))
+
     def get_knight_moves(self, start_pos: tuple[int, int]) -> list[tuple[tuple[int, int], tuple[int, int]]]:
-        legal_moves = []
-        direction_vectors = [(1, 2), (2, 1), (-1, 2), (-2, 1), (1, -2), (2, -1), (-1, -2), (-2, -1)]
-        for direction in direction_vectors:
-            end_pos = vector_add(start_pos, direction)
-            i, j = pos_to_indices(end_pos)
-            if 0 <= i < 8 and 0 <= j < 8:
-                end_piece = self.board[i][j]
-                if end_piece is None:
-                    legal_moves.append((start_pos, end_pos))
-                else:
-                    end_white = piece.get_piece_colour(end_piece)
-                    if end_white != self.white_move:
-                        legal_moves.append((start_pos, end_pos))
-        return legal_moves
-    
+        start_square = pos_to_square(start_pos)
+        own, enemy = self.own_and_enemy_pieces(start_square)
+        return self.moves_to_targets(start_square, bitboard.KNIGHT_ATTACKS[start_square] & ~own)
+
     def get_king_moves(self, start_pos: tuple[int, int]) -> list[tuple[tuple[int, int], tuple[int, int]]]:
-        legal_moves = []
-        direction_vectors = [(1, 1), (1, 0), (1, -1), (0, 1), (0, -1), (-1, 1), (-1, 0), (-1, -1)]
-        for direction in direction_vectors:
-            end_pos = vector_add(start_pos, direction)
-            i, j = pos_to_indices(end_pos)
-            if 0 <= i < 8 and 0 <= j < 8:
-                end_piece = self.board[i][j]
-                if end_piece is None:
-                    legal_moves.append((start_pos, end_pos))
-                else:
-                    end_white = piece.get_piece_colour(end_piece)
-                    if end_white != self.white_move:
-                        legal_moves.append((start_pos, end_pos))
-                        
-        king = self.get_piece_from_pos(start_pos)
+        start_square = pos_to_square(start_pos)
+        own, enemy = self.own_and_enemy_pieces(start_square)
+        legal_moves = self.moves_to_targets(start_square, bitboard.KING_ATTACKS[start_square] & ~own)
+
+        king = self.squares[start_square]
         assert king is not None
         piece_type, piece_white = piece.get_piece_attrs(king)
         if piece_white:
-            if self.castling_rights[0]:
+            if self.castling & WHITE_KINGSIDE:
                 legal_moves += self.check_castling(start_pos, (8, 1), [(7, 1), (6, 1)])
-            if self.castling_rights[1]:
+            if self.castling & WHITE_QUEENSIDE:
                 legal_moves += self.check_castling(start_pos, (1, 1), [(2, 1), (3, 1), (4, 1)])
         else:
-            if self.castling_rights[2]:
+            if self.castling & BLACK_KINGSIDE:
                 legal_moves += self.check_castling(start_pos, (8, 8), [(7, 8), (6, 8)])
-            if self.castling_rights[3]:
+            if self.castling & BLACK_QUEENSIDE:
                 legal_moves += self.check_castling(start_pos, (1, 8), [(2, 8), (3, 8), (4, 8)])
         return legal_moves
-    
+
     def check_castling(self, start_pos, rook_pos, in_between_posses) -> list[tuple[tuple[int, int], tuple[int, int]]]:
         """The arguments of this function are kind of weird but i just had too many repeated nested for loops with the arguments
         in the get_king_moves function so i think it makes the most sense here"""
         legal_moves = []
-        in_between_indices = [pos_to_indices(pos) for pos in in_between_posses]
-        in_between_pieces = [self.board[i][j] for i, j in in_between_indices]
-        if all(piece is None for piece in in_between_pieces):
+        in_between = 0
+        for pos in in_between_posses:
+            in_between |= 1 << pos_to_square(pos)
+        if not in_between & (self.occupancy[0] | self.occupancy[1]):
             direction = 1 if rook_pos[0] > start_pos[0] else -1
-            if self.not_in_check_after_move(start_pos, vector_add(start_pos, (direction, 0))) and self.not_in_check_after_move(start_pos, start_pos):
+            start_square = pos_to_square(start_pos)
+            enemy_white = not self.squares[start_square] >> 3  # type: ignore (the king is on start_pos)
+            if not self.is_square_attacked(start_square, enemy_white) and not self.is_square_attacked(start_square + direction, enemy_white):
                 """This is an odd idea because this is the only time we check if we are in check in the non-check_check functions
                 however, since you can't castle through check it is actually necessary here rather than in the rest of the cases
                 where we are only checking it for the user in seperate functions and leaving 'pseudo-legal' moves for the engine to use"""
                 legal_moves.append((start_pos, vector_add(start_pos, (2*direction, 0))))
-        return legal_moves  
-        
-    def get_bishop_moves(self, start_pos: tuple[int, int]) -> list[tuple[tuple[int, int], tuple[int, int]]]:
-        legal_moves = []
-        direction_vectors = [(1, 1), (1, -1), (-1, 1), (-1, -1)]
-        for direction in direction_vectors:
-            current_pos = start_pos
-            while True:
-                current_pos = vector_add(current_pos, direction)
-                i, j = pos_to_indices(current_pos)
-                if 0 <= i < 8 and 0 <= j < 8:
-                    end_piece = self.board[i][j]
-                    if end_piece is None:
-                        legal_moves.append((start_pos, current_pos))
-                    else:
-                        end_white = piece.get_piece_colour(end_piece)
-                        if end_white != self.white_move:
-                            legal_moves.append((start_pos, current_pos))
-                        break
-                else:
-                    break
         return legal_moves
-    
+
+    def get_bishop_moves(self, start_pos: tuple[int, int]) -> list[tuple[tuple[int, int], tuple[int, int]]]:
+        start_square = pos_to_square(start_pos)
+        own, enemy = self.own_and_enemy_pieces(start_square)
+        return self.moves_to_targets(start_square, bitboard.bishop_attacks(start_square, own | enemy) & ~own)
+
     def get_rook_moves(self, start_pos: tuple[int, int]) -> list[tuple[tuple[int, int], tuple[int, int]]]:
-        legal_moves = []
-        direction_vectors = [(1, 0), (0, 1), (0, -1), (-1, 0)]
-        for direction in direction_vectors:
-            current_pos = start_pos
-            while True:
-                current_pos = vector_add(current_pos, direction)
-                i, j = pos_to_indices(current_pos)
-                if 0 <= i < 8 and 0 <= j < 8:
-                    end_piece = self.board[i][j]
-                    if end_piece is None:
-                        legal_moves.append((start_pos, current_pos))
-                    else:
-                        end_white = piece.get_piece_colour(end_piece)
-                        if end_white != self.white_move:
-                            legal_moves.append((start_pos, current_pos))
-                        break
-                else:
-                    break
-        return legal_moves
-    
+        start_square = pos_to_square(start_pos)
+        own, enemy = self.own_and_enemy_pieces(start_square)
+        return self.moves_to_targets(start_square, bitboard.rook_attacks(start_square, own | enemy) & ~own)
+
     def get_queen_moves(self, start_pos: tuple[int, int]) -> list[tuple[tuple[int, int], tuple[int, int]]]:
-        return self.get_bishop_moves(start_pos) + self.get_rook_moves(start_pos)
-    
-    def make_move(self, start_pos: tuple[int, int], end_pos: tuple[int, int], promotion_piece: int = piece.QUEEN):
-        start_index, start_jndex = pos_to_indices(start_pos)
-        end_index, end_jndex = pos_to_indices(end_pos)
-        start_piece = self.board[start_index][start_jndex]
+        start_square = pos_to_square(start_pos)
+        own, enemy = self.own_and_enemy_pieces(start_square)
+        return self.moves_to_targets(start_square, bitboard.queen_attacks(start_square, own | enemy) & ~own)
+
+    def encode_move(self, start_pos: tuple[int, int], end_pos: tuple[int, int], promotion_piece: int = piece.QUEEN) -> int:
+        """pack a (start_pos, end_pos) move, working out its flags from the position"""
+        start_square = pos_to_square(start_pos)
+        end_square = pos_to_square(end_pos)
+        start_piece = self.squares[start_square]
         assert start_piece is not None
-        self.board[start_index][start_jndex] = None
+        piece_type = piece.get_piece_type(start_piece)
+        flags = MOVE_CAPTURE if self.squares[end_square] is not None else 0
+        promotion = 0
+        if piece_type == piece.PAWN:
+            if end_square == self.en_passant_square:
+                flags |= MOVE_CAPTURE | MOVE_EN_PASSANT
+            elif abs(start_square - end_square) == 16:
+                flags |= MOVE_DOUBLE_PUSH
+            if end_square >= 56 or end_square < 8:
+                promotion = promotion_piece
+        elif piece_type == piece.KING and abs(start_square - end_square) == 2:
+            flags |= MOVE_CASTLE
+        return encode_move(start_square, end_square, promotion, flags)
 
-        to_take = self.board[end_index][end_jndex]
+    def make_move(self, start_pos: tuple[int, int], end_pos: tuple[int, int], promotion_piece: int = piece.QUEEN) -> Undo:
+        """make the move in place and return the undo record that unmake_move needs to take it back"""
+        return self.make_packed_move(self.encode_move(start_pos, end_pos, promotion_piece))
+
+    def make_packed_move(self, move: int) -> Undo:
+        """make_move for a packed move from generate_legal_moves or encode_move"""
+        start_square = move & 0b111111
+        end_square = (move >> 6) & 0b111111
+        castling = self.castling
+        en_passant_square = self.en_passant_square
+        half_moves_count = self.half_moves_count
+        full_moves_count = self.full_moves_count
+        hash_key = self.hash_key
+        start_piece = self.remove_piece(start_square)
+        assert start_piece is not None
+        piece_type, piece_white = piece.get_piece_attrs(start_piece)
+
+        to_take = self.remove_piece(end_square)
         if to_take is not None:
-            self.half_moves_count = -1
-            if end_pos == (8, 1):
-                self.castling_rights[0] = False
-            elif end_pos == (1, 1):
-                self.castling_rights[1] = False
-            elif end_pos == (8, 8):
-                self.castling_rights[2] = False
-            elif end_pos == (1, 8):
-                self.castling_rights[3] = False
-                    #  These might not be a rook, but in that case they would already be False since the original rook is gone
-                
-        self.board[end_index][end_jndex] = start_piece
-        self.half_moves_count += 1
+            self.castling &= ~CORNER_CASTLING_RIGHTS.get(end_square, 0)
+            #  These might not be a rook, but in that case they would already be False since the original rook is gone
+        if move & MOVE_EN_PASSANT:
+            to_take = self.remove_piece(end_square - 8 if piece_white else end_square + 8)
+        promotion_piece = (move >> MOVE_PROMOTION_SHIFT) & 0b111
+        self.put_piece(end_square, piece.generate_piece(promotion_piece, piece_white) if promotion_piece else start_piece)
+
+        if to_take is not None or piece_type == piece.PAWN:
+            self.half_moves_count = 0
+        else:
+            self.half_moves_count += 1
         if not self.white_move:
             self.full_moves_count += 1
         self.white_move = not self.white_move
+        self.hash_key ^= zobrist.WHITE_TO_MOVE_KEY
 
-        piece_type, piece_white = piece.get_piece_attrs(start_piece)
-        if piece_type == piece.PAWN and end_pos == self.en_passant_square:
-            pawn_to_take_pos = end_pos[0], start_pos[1]
-            i, j = pos_to_indices(pawn_to_take_pos)
-            self.board[i][j] = None
+        if self.en_passant_square is not None:
+            self.hash_key ^= zobrist.EN_PASSANT_KEYS[self.en_passant_square]
         self.en_passant_square = None
+        if move & MOVE_DOUBLE_PUSH:
+            self.en_passant_square = (start_square + end_square) // 2
+            self.hash_key ^= zobrist.EN_PASSANT_KEYS[self.en_passant_square]
 
-        if piece_type == piece.PAWN:
-            self.half_moves_count = 0
-            if abs(start_pos[1] - end_pos[1]) == 2:
-                self.en_passant_square = vector_add(start_pos, (0, 1 if piece_white else -1))
-
-            if (end_pos[1] == 1 or end_pos[1] == 8):
-                self.board[end_index][end_jndex] = piece.generate_piece(promotion_piece, piece_white)
-
-        if piece_type == piece.KING and abs(start_pos[0] - end_pos[0]) == 2:
-            if piece_white:
-                rank = 1
-            else:
-                rank = 8
-            if end_pos[0] == 7:
-                rook_start_pos = (8, rank)
-                rook_start_i, rook_start_j = pos_to_indices(rook_start_pos)
-                rook_end_pos = (6, rank)
-                rook_end_i, rook_end_j = pos_to_indices(rook_end_pos)
-                rook = self.board[rook_start_i][rook_start_j]
+        if move & MOVE_CASTLE:
+            if end_square > start_square:
+                rook = self.remove_piece(end_square + 1)
                 assert rook is not None
-                self.board[rook_start_i][rook_start_j] = None
-                self.board[rook_end_i][rook_end_j] = rook
-            elif end_pos[0] == 3:
-                rook_start_pos = (1, rank)
-                rook_start_i, rook_start_j = pos_to_indices(rook_start_pos)
-                rook_end_pos = (4, rank)
-                rook_end_i, rook_end_j = pos_to_indices(rook_end_pos)
-                rook = self.board[rook_start_i][rook_start_j]
+                self.put_piece(end_square - 1, rook)
+            else:
+                rook = self.remove_piece(end_square - 2)
                 assert rook is not None
-                self.board[rook_start_i][rook_start_j] = None
-                self.board[rook_end_i][rook_end_j] = rook
+                self.put_piece(end_square + 1, rook)
 
         if piece_type == piece.KING:
             if piece_white:
-                self.castling_rights[0] = False
-                self.castling_rights[1] = False
+                self.castling &= ~(WHITE_KINGSIDE | WHITE_QUEENSIDE)
             else:
-                self.castling_rights[2] = False
-                self.castling_rights[3] = False
+                self.castling &= ~(BLACK_KINGSIDE | BLACK_QUEENSIDE)
         if piece_type == piece.ROOK:
-            if start_pos == (8, 1):
-                self.castling_rights[0] = False
-            elif start_pos == (1, 1):
-                self.castling_rights[1] = False
-            elif start_pos == (8, 8):
-                self.castling_rights[2] = False
-            elif start_pos == (1, 8):
-                self.castling_rights[3] = False
+            self.castling &= ~CORNER_CASTLING_RIGHTS.get(start_square, 0)
+        self.hash_key ^= zobrist.CASTLING_KEYS[castling] ^ zobrist.CASTLING_KEYS[self.castling]
+        return (move, start_piece, to_take, castling, en_passant_square, half_moves_count, full_moves_count, hash_key)
 
+    def unmake_move(self, undo: Undo):
+        """restore the position from before the make_move call that returned undo
+        moves have to be unmade in the reverse order they were made"""
+        move, start_piece, to_take, castling, en_passant_square, half_moves_count, full_moves_count, hash_key = undo
+        start_square = move & 0b111111
+        end_square = (move >> 6) & 0b111111
+        self.remove_piece(end_square)  # might be a promoted piece, so put start_piece back rather than this
+        if move & MOVE_CASTLE:
+            if end_square > start_square:
+                rook = self.remove_piece(end_square - 1)
+                assert rook is not None
+                self.put_piece(end_square + 1, rook)
+            else:
+                rook = self.remove_piece(end_square + 1)
+                assert rook is not None
+                self.put_piece(end_square - 2, rook)
+        self.put_piece(start_square, start_piece)
+        if to_take is not None:
+            if move & MOVE_EN_PASSANT:
+                self.put_piece(end_square - 8 if start_piece & piece.WHITE else end_square + 8, to_take)
+            else:
+                self.put_piece(end_square, to_take)
+        self.castling = castling
+        self.en_passant_square = en_passant_square
+        self.half_moves_count = half_moves_count
+        self.full_moves_count = full_moves_count
+        self.white_move = not self.white_move
+        self.hash_key = hash_key
+
+    def make_null_move(self) -> tuple[int | None, int]:
+        """pass the turn without moving, for null move pruning. returns what unmake_null_move needs"""
+        undo = (self.en_passant_square, self.hash_key)
+        if self.en_passant_square is not None:
+            self.hash_key ^= zobrist.EN_PASSANT_KEYS[self.en_passant_square]
+            self.en_passant_square = None
+        self.white_move = not self.white_move
+        self.hash_key ^= zobrist.WHITE_TO_MOVE_KEY
+        return undo
+
+    def unmake_null_move(self, undo: tuple[int | None, int]):
+        self.en_passant_square, self.hash_key = undo
+        self.white_move = not self.white_move
 
 PIECEWISE_LEGAL_MOVES = {
     piece.PAWN: Game.get_pawn_moves,
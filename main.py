@@ -1,4 +1,5 @@
 import pygame
+import time
 from game import Game
 import piece
 from utils_and_constants import *
@@ -17,6 +18,7 @@ def load_image(path: str, size: tuple[int, int]) -> pygame.surface.Surface:
     return image
 
 SERVER_URL = "localhost:5000"
+ANALYSIS_LINES = 3  # best moves shown by deep engine analysis
 BOARD_IMG = load_image(preferences[Prefs.BOARD_IMAGE], (512, 512))
 MOUSE_ACTIONS = [pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP, pygame.MOUSEMOTION]
 pygame.font.init()
@@ -26,7 +28,7 @@ UI_TEXT = {
     0: ["1. GUI Settings", "2. Import/Export", "3. Engine", "4. Debug"],
     1: ["0. Home", "B. Flip Board", "P. Personalisation Settings", "Left Arrow. Back", "Right Arrow. Forward"],
     2: ["0. Home", "F. Print FEN To Console", "C. Copy FEN To Clipboard", "V. Paste FEN From Clipboard", "O. Open Opening Explorer", "I. Open Endgame Scenarios", "Home. Load Start Position", "End. Clear Board"],
-    3: ["0. Home", "M. Print Engine Move To Console", "S. Start/Stop Playing Against Engine (Engine's move when enabled)", "E. Start/Stop Deep Engine Analysis", "Z. Deep Server Analysis"],
+    3: ["0. Home", "M. Print Engine Move To Console", "S. Start/Stop Playing Against Engine (Engine's move when enabled)", "N. Enable/Disable Pondering", "E. Start/Stop Deep Engine Analysis", "Z. Deep Server Analysis"],
     4: ["0. Home", "L. Print Legal Moves To Console"]
 }
 
@@ -45,8 +47,15 @@ class UserInterface:
         self.ui_text_mode = 0
         self.state = GameState.WHITE_TURN
         self.engine_mode = False
-        self.engine_playing = False
-        self.background_engine = None
+        self.engine_white = True  # the side the engine plays in engine mode
+        engine.set_search_threads(preferences[Prefs.ENGINE_THREADS])  # before any search, they'd have to finish first
+        self.playing_engine = engine.Engine()  # searches the engine's moves, and the player's expected reply while pondering
+        self.engine_thinking_since: float | None = None  # when the engine's current move search (or the ponder hit) started
+        self.engine_principal_variation: list[str] = []  # from the engine's last move, the second move is the expected reply
+        self.pondering = True
+        self.ponder_move: str | None = None  # the reply being pondered on, in uci
+        self.background_engine = engine.Engine()  # one analysis worker for the whole session, idle until E is pressed
+        self.analysing = False
 
         self.list_of_FENs: list[str | None] = [self.game.get_fen()]
         self.move_list = MoveList()
@@ -71,13 +80,14 @@ class UserInterface:
         while self.running:
             self.clock.tick(60)
             self.handle_events()
+            self.check_engine_move()
             self.draw()
 
     def handle_events(self):
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
-                if self.background_engine is not None:
-                    self.background_engine.running = False
+                self.background_engine.close()
+                self.playing_engine.close()
                 self.running = False
             if event.type in MOUSE_ACTIONS:
                 if event.type == pygame.MOUSEMOTION or event.button == 1:
@@ -120,15 +130,21 @@ class UserInterface:
                     print(engine.get_value_and_best_move(self.game, preferences[Prefs.DEFAULT_ENGINE_DEPTH]))
                 if event.key == pygame.K_s:
                     self.engine_mode = not self.engine_mode
-                    self.engine_playing = False
+                    self.stop_engine()
                     if self.engine_mode:
+                        self.engine_white = self.game.get_white_move()
                         self.make_engine_move()
+                if event.key == pygame.K_n:
+                    self.pondering = not self.pondering
+                    if not self.pondering and self.ponder_move is not None:
+                        self.playing_engine.stop()
+                        self.ponder_move = None
                 if event.key == pygame.K_e:
-                    if self.background_engine is None:
-                        self.background_engine = engine.Engine(self.game.copy())
+                    self.analysing = not self.analysing
+                    if self.analysing:
+                        self.background_engine.start(self.game, ANALYSIS_LINES)
                     else:
-                        self.background_engine.running = False
-                        self.background_engine = None
+                        self.background_engine.stop()
                 if event.key == pygame.K_z:
                     try:
                         fen = self.game.get_fen()
@@ -153,7 +169,7 @@ class UserInterface:
     def update(self, event: pygame.event.Event):
         for rank in self.pieces:
             for item in rank:
-                if item is not None and piece.get_piece_colour(item.piece) == self.game.get_white_move():
+                if item is not None and piece.get_piece_colour(item.piece) == self.game.get_white_move() and not self.engine_to_move():
                     return_value = item.update(event)
                     self.handle_piece_update_return_value(item, return_value)
 
@@ -169,6 +185,7 @@ class UserInterface:
             piece.rect.topleft = piece.start_coords
 
     def make_move(self, start_pos: tuple[int, int], end_pos: tuple[int, int]):
+        uci_move = packed_move_to_uci(self.game.encode_move(start_pos, end_pos))  # with the promotion, unlike pos_move_to_uci
         self.game.make_move(start_pos, end_pos)
         self.pieces = self.generate_display_pieces()
         self.list_of_FENs = self.list_of_FENs[0:self.get_current_list_of_FENs_idx()]
@@ -183,30 +200,80 @@ class UserInterface:
             self.state = self.game.get_game_state()
 
         if self.engine_mode:
-            self.draw()  # looks kinda ugly without
-            self.make_engine_move()
-        if self.background_engine is not None:
-            self.background_engine.running = False
-            self.background_engine = engine.Engine(self.game.copy())
+            if self.state in ENDED_STATES:
+                self.stop_engine()
+            elif self.engine_to_move():
+                self.make_engine_move(uci_move)
+            else:
+                self.start_pondering()
+        if self.analysing:
+            self.background_engine.start(self.game, ANALYSIS_LINES)
 
         if self.auto_flip:
             if self.game.get_white_move() == self.flipped:
                 self.flip()
         
 
-    def make_engine_move(self):
-        try:
-            self.engine_playing = not self.engine_playing
-            if self.engine_playing:
-                evaluation, best_move = engine.get_value_and_best_move(self.game, preferences[Prefs.DEFAULT_ENGINE_DEPTH])
-                if best_move is None or self.state in ENDED_STATES:
-                    print("No legal moves")
-                    return
-                self.make_move(*best_move)
-        except Exception as e:
-            print(f"Unable to make engine move: {e}")
-            self.engine_playing = False
-            self.engine_mode = False
+    def engine_to_move(self) -> bool:
+        return self.engine_mode and self.game.get_white_move() == self.engine_white
+
+    def make_engine_move(self, last_move: str | None = None):
+        """start the engine thinking, check_engine_move plays the move once it's done. last_move is the player's move in
+        uci, if it's the one being pondered on the search already running on this position just carries on"""
+        if last_move is not None and last_move == self.ponder_move:
+            print("Ponder hit")
+            self.ponder_move = None
+            self.engine_thinking_since = time.perf_counter()
+            return
+        self.ponder_move = None
+        opening = engine.opening_book_move(self.game)
+        if opening is not None:
+            self.playing_engine.stop()
+            self.engine_thinking_since = None
+            self.engine_principal_variation = []
+            self.make_move(*packed_move_to_pos_move(opening[1]))
+            return
+        # a ponder miss still leaves the transposition table full of positions from around here
+        self.playing_engine.start(self.game)
+        self.engine_thinking_since = time.perf_counter()
+
+    def check_engine_move(self):
+        """called every frame, plays the engine's move once it has searched for long enough"""
+        if self.engine_thinking_since is None:
+            return
+        analysis = self.playing_engine.snapshot()
+        thinking_time = time.perf_counter() - self.engine_thinking_since
+        done = (not analysis["running"] or thinking_time >= preferences[Prefs.MAXIMUM_ENGINE_TIME]
+                or (thinking_time >= preferences[Prefs.MINIMUM_ENGINE_TIME] and analysis["depth"] >= preferences[Prefs.DEFAULT_ENGINE_DEPTH]))
+        if not done or (analysis["best_move"] is None and analysis["running"]):
+            return  # always wait for the first depth, so there's a move to play
+        self.playing_engine.stop()
+        self.engine_thinking_since = None
+        if analysis["best_move"] is None or self.state in ENDED_STATES:
+            print("No legal moves")
+            return
+        print(f"Engine move {pos_move_to_uci(analysis['best_move'])} at depth {analysis['depth']}, evaluation {analysis['score']}")
+        self.engine_principal_variation = analysis["principal_variation"]
+        self.make_move(*analysis["best_move"])
+
+    def start_pondering(self):
+        """search the position after the reply the engine expects while the player thinks, see make_engine_move"""
+        if not self.pondering or len(self.engine_principal_variation) < 2:
+            return
+        expected_reply = self.engine_principal_variation[1]
+        for move in self.game.generate_legal_moves():
+            if packed_move_to_uci(move) == expected_reply:
+                ponder_game = self.game.copy()
+                ponder_game.make_packed_move(move)
+                self.playing_engine.start(ponder_game)
+                self.ponder_move = expected_reply
+                return
+
+    def stop_engine(self):
+        self.playing_engine.stop()
+        self.engine_thinking_since = None
+        self.engine_principal_variation = []
+        self.ponder_move = None
 
     def load_fen(self, fen: str, reset_list_of_FENs: bool = True):
         self.game = Game(fen)
@@ -221,6 +288,13 @@ class UserInterface:
             self.move_list.prepend("--")
             self.move_list.prepend("--")
         self.move_list.set_current_idx(self.get_current_list_of_FENs_idx()-1)
+        if self.analysing:
+            self.background_engine.start(self.game, ANALYSIS_LINES)
+        if self.engine_mode:
+            self.stop_engine()
+            # only the latest position of the game is played on, scrolling back through it just reviews the moves
+            if self.engine_to_move() and self.get_current_list_of_FENs_idx() == len(self.list_of_FENs) - 1:
+                self.make_engine_move()
 
     def scroll_through_game(self, left: bool):
         if left:
@@ -267,10 +341,12 @@ class UserInterface:
         if self.ui_text_mode == 1:
             display_text.append(f"A. Auto-Flip: {'Enabled' if self.auto_flip else 'Disabled'}")
         if self.ui_text_mode == 3:
-            if self.background_engine is not None:
-                display_text.append(f"Engine at depth {self.background_engine.depth}")
-                if self.background_engine.best_move is not None:
-                    display_text.append(f"Best move {pos_move_to_uci(self.background_engine.best_move)}")
+            display_text.append(f"Pondering: {'Enabled' if self.pondering else 'Disabled'}{f', expecting {self.ponder_move}' if self.ponder_move else ''}")
+            if self.analysing:
+                analysis = self.background_engine.snapshot()
+                display_text.append(f"Engine at depth {analysis['depth']}{'' if analysis['running'] else ' (finished)'}, evaluation {analysis['score']}")
+                for score, best_move, principal_variation in analysis["lines"]:
+                    display_text.append(f"{score}: {' '.join(principal_variation)}")
         if self.ui_text_mode == 4:
             # This is usually really bad practice however for this case where we are debugging,
             # we actually do want to read the objects internal dictionary
@@ -0,0 +1,91 @@
+"""Move lists cached by zobrist key
+every thread gets its own table so the UI, the background engine and the server never share or lock one,
+tables only hold the keys and move tuples, never the games themselves
+a thread's table goes when the thread does, so short lived threads like server requests don't keep theirs around"""
+import itertools
+import sys
+import threading
+import weakref
+
+DEFAULT_MEGABYTES = 16
+# rough size of a table entry (dict slot, key int and tuple header) not counting the moves themselves
+ENTRY_OVERHEAD_BYTES = sys.getsizeof(()) + sys.getsizeof(1 << 62) + 48
+
+
+class MoveTable:
+    """one thread's cached moves, a class rather than a dict so MoveCache can hold it weakly"""
+    def __init__(self):
+        self.moves: dict[int, tuple] = {}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+
+class MoveCache:
+    def __init__(self, megabytes: float = DEFAULT_MEGABYTES):
+        self.max_bytes = int(megabytes * 1024 * 1024)
+        self.local = threading.local()  # the only strong reference to each table, freed with its thread
+        # every live thread's table, only so stats and clear can see them
+        self.all_tables: weakref.WeakValueDictionary[int, MoveTable] = weakref.WeakValueDictionary()
+        self.table_ids = itertools.count()
+        self.tables_lock = threading.Lock()  # only taken the first time a thread uses the cache
+
+    def table(self) -> MoveTable:
+        """this thread's table"""
+        try:
+            return self.local.table
+        except AttributeError:
+            table = MoveTable()
+            self.local.table = table
+            with self.tables_lock:
+                self.all_tables[next(self.table_ids)] = table
+            return table
+
+    def get(self, key: int) -> tuple | None:
+        table = self.table()
+        moves = table.moves.get(key)
+        if moves is None:
+            table.misses += 1
+        else:
+            table.hits += 1
+        return moves
+
+    def put(self, key: int, moves: tuple):
+        table = self.table()
+        size = ENTRY_OVERHEAD_BYTES + 8 * len(moves) + (sys.getsizeof(moves[0]) * len(moves) if moves else 0)
+        if table.bytes + size > self.max_bytes:
+            table.moves.clear()  # cheaper than tracking recency, and positions near the root get added straight back
+            table.bytes = 0
+        table.moves[key] = moves
+        table.bytes += size
+
+    def resize(self, megabytes: float):
+        self.max_bytes = int(megabytes * 1024 * 1024)
+        self.clear()
+
+    def clear(self):
+        """empty every thread's table, the counters are kept"""
+        with self.tables_lock:
+            tables = list(self.all_tables.values())
+        for table in tables:
+            table.moves = {}
+            table.bytes = 0
+
+    def stats(self) -> dict[str, int | float]:
+        """hits, misses, hit rate, entries and approximate bytes summed over every live thread"""
+        with self.tables_lock:
+            tables = list(self.all_tables.values())
+        hits = sum(table.hits for table in tables)
+        misses = sum(table.misses for table in tables)
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "entries": sum(len(table.moves) for table in tables),
+            "bytes": sum(table.bytes for table in tables),
+        }
+
+
+# one cache for strictly legal packed moves and one for the pseudo legal (start_pos, end_pos) moves the UI uses
+legal_moves_cache = MoveCache()
+pseudo_legal_moves_cache = MoveCache(DEFAULT_MEGABYTES / 4)
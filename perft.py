@@ -0,0 +1,133 @@
+"""Perft: counts the leaf nodes of the legal move tree to a given depth
+comparing the counts against known ones is the standard way to check move generation, and timing it shows how fast it is
+
+python perft.py --depth 4                      start position
+python perft.py --fen "<fen>" --depth 3 --divide
+python perft.py --suite --processes 8          every reference position below --max-nodes"""
+import argparse
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from game import Game
+from utils_and_constants import *
+
+# (name, fen, depth, nodes), counts from the chess programming wiki and Martin Sedlak's edge case suite
+REFERENCE_POSITIONS = [
+    ("start position", DEFAULT_FEN, 1, 20),
+    ("start position", DEFAULT_FEN, 2, 400),
+    ("start position", DEFAULT_FEN, 3, 8902),
+    ("start position", DEFAULT_FEN, 4, 197281),
+    ("start position", DEFAULT_FEN, 5, 4865609),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", 1, 48),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", 2, 2039),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", 3, 97862),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", 4, 4085603),
+    ("position 3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", 4, 43238),
+    ("position 3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", 5, 674624),
+    ("position 4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1", 3, 9467),
+    ("position 4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1", 4, 422333),
+    ("position 5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", 3, 62379),
+    ("position 5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", 4, 2103487),
+    ("position 6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10", 3, 89890),
+    ("illegal en passant 1", "3k4/3p4/8/K1P4r/8/8/8/8 b - - 0 1", 6, 1134888),
+    ("illegal en passant 2", "8/8/4k3/8/2p5/8/B2P2K1/8 w - - 0 1", 6, 1015133),
+    ("en passant capture checks opponent", "8/8/1k6/2b5/2pP4/8/5K2/8 b - d3 0 1", 6, 1440467),
+    ("short castling gives check", "5k2/8/8/8/8/8/8/4K2R w K - 0 1", 6, 661072),
+    ("long castling gives check", "3k4/8/8/8/8/8/8/R3K3 w Q - 0 1", 6, 803711),
+    ("castle rights", "r3k2r/1b4bq/8/8/8/8/7B/R3K2R w KQkq - 0 1", 4, 1274206),
+    ("castling prevented", "r3k2r/8/3Q4/8/8/5q2/8/R3K2R b KQkq - 0 1", 4, 1720476),
+    ("promote out of check", "2K2r2/4P3/8/8/8/8/8/3k4 w - - 0 1", 6, 3821001),
+    ("discovered check", "8/8/1P2K3/8/2n5/1q6/8/5k2 b - - 0 1", 5, 1004658),
+    ("promote to give check", "4k3/1P6/8/8/8/8/K7/8 w - - 0 1", 6, 217342),
+    ("underpromote to check", "8/P1k5/K7/8/8/8/8/8 w - - 0 1", 6, 92683),
+    ("self stalemate", "K1k5/8/P7/8/8/8/8/8 w - - 0 1", 6, 2217),
+    ("stalemate and checkmate", "8/k1P5/8/1K6/8/8/8/8 w - - 0 1", 7, 567584),
+    ("stalemate and checkmate 2", "8/8/2k5/5q2/5n2/8/5K2/8 b - - 0 1", 4, 23527),
+]
+
+def perft(game: Game, depth: int) -> int:
+    """number of leaf nodes depth plies below game, game is left as it was"""
+    if depth == 0:
+        return 1
+    legal_moves = game.generate_legal_moves()
+    if depth == 1:
+        return len(legal_moves)  # no need to make moves just to count them
+    nodes = 0
+    for move in legal_moves:
+        undo = game.make_packed_move(move)
+        nodes += perft(game, depth - 1)
+        game.unmake_move(undo)
+    return nodes
+
+def perft_after_move(fen: str, move: int, depth: int) -> int:
+    """worker for split perfts, positions are sent as a fen and a packed move rather than pickled games"""
+    game = Game(fen)
+    game.make_packed_move(move)
+    return perft(game, depth - 1)
+
+def divide(game: Game, depth: int, processes: int = 1) -> dict[str, int]:
+    """leaf node count under each root move, root moves are shared between processes if processes > 1"""
+    root_moves = game.generate_legal_moves()
+    if processes > 1 and depth > 1:
+        fen = game.get_fen()
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            futures = [executor.submit(perft_after_move, fen, move, depth) for move in root_moves]
+            return {packed_move_to_uci(move): future.result() for move, future in zip(root_moves, futures)}
+    counts = {}
+    for move in root_moves:
+        undo = game.make_packed_move(move)
+        counts[packed_move_to_uci(move)] = perft(game, depth - 1)
+        game.unmake_move(undo)
+    return counts
+
+def timed_perft(fen: str, depth: int, processes: int = 1) -> tuple[int, float, dict[str, int]]:
+    """return nodes, seconds taken and the divide counts"""
+    game = Game(fen)
+    t0 = time.perf_counter()
+    if depth == 0:
+        return 1, time.perf_counter() - t0, {}
+    counts = divide(game, depth, processes)
+    return sum(counts.values()), time.perf_counter() - t0, counts
+
+def nodes_per_second(nodes: int, seconds: float) -> int:
+    return int(nodes / seconds) if seconds > 0 else 0
+
+def run_suite(max_nodes: int, processes: int = 1) -> bool:
+    """run every reference position with at most max_nodes leaves, return whether they all matched"""
+    all_passed = True
+    total_nodes = 0
+    total_seconds = 0.0
+    for name, fen, depth, expected in REFERENCE_POSITIONS:
+        if expected > max_nodes:
+            continue
+        nodes, seconds, _ = timed_perft(fen, depth, processes)
+        total_nodes += nodes
+        total_seconds += seconds
+        passed = nodes == expected
+        all_passed = all_passed and passed
+        print(f"{'ok  ' if passed else 'FAIL'} {name} depth {depth}: {nodes} (expected {expected}) in {seconds:.2f}s, {nodes_per_second(nodes, seconds)} nodes/s")
+    print(f"{total_nodes} nodes in {total_seconds:.2f}s, {nodes_per_second(total_nodes, total_seconds)} nodes/s")
+    return all_passed
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Count leaf nodes of the legal move tree")
+    parser.add_argument("--fen", default=DEFAULT_FEN)
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--divide", action="store_true", help="print the count under each root move")
+    parser.add_argument("--processes", type=int, default=1, help="split root moves across this many processes")
+    parser.add_argument("--suite", action="store_true", help="check the reference positions instead")
+    parser.add_argument("--max-nodes", type=int, default=1000000, help="skip reference positions bigger than this")
+    args = parser.parse_args(argv)
+
+    if args.suite:
+        return 0 if run_suite(args.max_nodes, args.processes) else 1
+
+    nodes, seconds, counts = timed_perft(args.fen, args.depth, args.processes)
+    if args.divide:
+        for name, count in sorted(counts.items()):
+            print(f"{name}: {count}")
+    print(f"{nodes} nodes in {seconds:.2f}s, {nodes_per_second(nodes, seconds)} nodes/s")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -44,9 +44,23 @@ class PersonalisationCustomiser:
         min_engine_time_entry = tkinter.Entry(min_engine_time_frame)
         min_engine_time_entry.pack()
         self.min_engine_time_getter = lambda: int(min_engine_time_entry.get())
+        max_engine_time_frame = tkinter.Frame(self.root)
+        max_engine_time_frame.grid(row=2, column=0)
+        max_engine_time_label = tkinter.Label(max_engine_time_frame, text="Max Engine Time (Seconds)")
+        max_engine_time_label.pack()
+        max_engine_time_entry = tkinter.Entry(max_engine_time_frame)
+        max_engine_time_entry.pack()
+        self.max_engine_time_getter = lambda: int(max_engine_time_entry.get())
+        engine_threads_frame = tkinter.Frame(self.root)
+        engine_threads_frame.grid(row=2, column=1)
+        engine_threads_label = tkinter.Label(engine_threads_frame, text="Engine Threads")
+        engine_threads_label.pack()
+        engine_threads_entry = tkinter.Entry(engine_threads_frame)
+        engine_threads_entry.pack()
+        self.engine_threads_getter = lambda: int(engine_threads_entry.get())
 
         piece_images_frame = tkinter.Frame(self.root)
-        piece_images_frame.grid(row=2, column=0, columnspan=3)
+        piece_images_frame.grid(row=3, column=0, columnspan=3)
         white_piece_images_frame = tkinter.Frame(piece_images_frame)
         white_piece_images_frame.grid(row=0, column=0)
         black_piece_images_frame = tkinter.Frame(piece_images_frame)
@@ -65,7 +79,7 @@ class PersonalisationCustomiser:
             self.make_image_uploader(black_piece_image_frame, f"Black {PIECE_NAMES[piece]}", piece)
 
         finish_buttons_frame = tkinter.Frame(self.root)
-        finish_buttons_frame.grid(row=3, column=0, columnspan=3)
+        finish_buttons_frame.grid(row=4, column=0, columnspan=3)
         submit_button = tkinter.Button(finish_buttons_frame, text="Submit (invalid inputs will not be changed)", command=self.submit)
         submit_button.grid(row=0, column=0)
         reset_button = tkinter.Button(finish_buttons_frame, text="Reset to Defaults", command=self.reset)
@@ -83,6 +97,8 @@ class PersonalisationCustomiser:
     def submit(self):
         with open("preferences.pkl", "rb") as f:
             pref = pickle.load(f)
+        for key, value in DEFAULT_PREFERENCES.items():
+            pref.setdefault(key, value)
         key_getter_pairs = [
             (Prefs.BACKGROUND_COLOUR, self.background_colour_getter),
             (Prefs.CONTRASTING_COLOUR, self.secondary_colour_getter),
@@ -90,6 +106,8 @@ class PersonalisationCustomiser:
             (Prefs.DEFAULT_ENGINE_DEPTH, self.engine_depth_getter),
             (Prefs.FONT_SIZE, self.font_size_getter),
             (Prefs.MINIMUM_ENGINE_TIME, self.min_engine_time_getter),
+            (Prefs.MAXIMUM_ENGINE_TIME, self.max_engine_time_getter),
+            (Prefs.ENGINE_THREADS, self.engine_threads_getter),
         ]
         for key, getter in key_getter_pairs:
             try:
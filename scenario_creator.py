@@ -44,11 +44,10 @@ class ScenarioCreator:
             self.generate_fen()
             if self.fen is None:
                 return
-            g = game.Game(self.fen)
-            g.white_move = not g.white_move
-            if g.not_in_check():
-                g.white_move = not g.white_move
-                if g.not_in_check():
+            fboard, side, castling = self.fen.split(" ")
+            other_side = "b" if side == "w" else "w"
+            if game.Game(f"{fboard} {other_side} {castling}").not_in_check():
+                if game.Game(self.fen).not_in_check():
                     self.root.destroy()
                     return
 
@@ -0,0 +1,98 @@
+"""Statistics for one engine search
+the search counts nodes, table hits and cutoffs on its SearchContext, and iterative deepening records a snapshot of
+those counters here after every completed depth, along with the time it took and the principal variation so far"""
+import json
+import logging
+import time
+
+# counters kept on SearchContext, see SearchContext.counters
+COUNTER_NAMES = ("nodes", "quiescence_nodes", "table_probes", "table_hits", "table_cutoffs", "cutoffs", "first_move_cutoffs")
+
+# structured log sink, every finished search is logged here as one json object. nothing is shown unless the
+# program sets up logging, e.g. logging.basicConfig(level=logging.INFO) or a handler writing to a file
+logger = logging.getLogger("chess.search")
+
+
+class SearchStatistics:
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.end_time: float | None = None
+        self.counters = dict.fromkeys(COUNTER_NAMES, 0)
+        self.iterations: list[dict] = []  # one per completed depth, see record_iteration
+        self.depth = 0
+        self.score = 0  # white positive
+        self.principal_variation: list[str] = []  # uci moves
+
+    def add_counters(self, counters: dict[str, int]):
+        """add counters from a search this one is made of, like the root moves of a split search"""
+        for name in COUNTER_NAMES:
+            self.counters[name] += counters[name]
+
+    def record_iteration(self, depth: int, score: int, principal_variation: list[str], counters: dict[str, int] | None = None):
+        """counters are the running totals so far, if they're kept elsewhere rather than added with add_counters"""
+        if counters is not None:
+            self.counters = dict(counters)
+        seconds = time.perf_counter() - self.start_time
+        previous_seconds = self.iterations[-1]["seconds"] if self.iterations else 0.0
+        previous_nodes = self.iterations[-1]["total_nodes"] if self.iterations else 0
+        self.iterations.append({
+            "depth": depth,
+            "seconds": seconds,
+            "depth_seconds": seconds - previous_seconds,
+            "total_nodes": self.counters["nodes"],
+            "depth_nodes": self.counters["nodes"] - previous_nodes,
+            "score": score,
+            "principal_variation": principal_variation,
+        })
+        self.depth = depth
+        self.score = score
+        self.principal_variation = principal_variation
+
+    def finish(self, counters: dict[str, int] | None = None):
+        """stop the clock, counters include any abandoned last iteration"""
+        if counters is not None:
+            self.counters = dict(counters)
+        self.end_time = time.perf_counter()
+
+    def seconds(self) -> float:
+        return (self.end_time if self.end_time is not None else time.perf_counter()) - self.start_time
+
+    def nodes_per_second(self) -> int:
+        seconds = self.seconds()
+        return int(self.counters["nodes"] / seconds) if seconds > 0 else 0
+
+    def effective_branching_factor(self) -> float:
+        """how many times more nodes the last completed depth took than the one before, 0 with fewer than two depths"""
+        if len(self.iterations) < 2 or not self.iterations[-2]["depth_nodes"]:
+            return 0.0
+        return self.iterations[-1]["depth_nodes"] / self.iterations[-2]["depth_nodes"]
+
+    def rate(self, name: str, out_of: str) -> float:
+        return self.counters[name] / self.counters[out_of] if self.counters[out_of] else 0.0
+
+    def as_dict(self) -> dict:
+        """everything as plain json types, for the server and the log"""
+        return {
+            **self.counters,
+            "seconds": self.seconds(),
+            "nodes_per_second": self.nodes_per_second(),
+            "depth": self.depth,
+            "score": self.score,
+            "principal_variation": self.principal_variation,
+            "effective_branching_factor": self.effective_branching_factor(),
+            "table_hit_rate": self.rate("table_hits", "table_probes"),
+            "table_cutoff_rate": self.rate("table_cutoffs", "table_probes"),
+            "first_move_cutoff_rate": self.rate("first_move_cutoffs", "cutoffs"),
+            "iterations": self.iterations,
+        }
+
+    def summary(self) -> str:
+        return (f"depth {self.depth} score {self.score} nodes {self.counters['nodes']} ({self.counters['quiescence_nodes']} quiescence) "
+                f"in {self.seconds():.2f}s, {self.nodes_per_second()} nodes/s, branching factor {self.effective_branching_factor():.2f}, "
+                f"table hits {self.rate('table_hits', 'table_probes'):.0%}, first move cutoffs {self.rate('first_move_cutoffs', 'cutoffs'):.0%}, "
+                f"pv {' '.join(self.principal_variation)}")
+
+
+def log_statistics(statistics: SearchStatistics, **fields):
+    """fields are added to the logged object, like the fen searched"""
+    logger.info(json.dumps({**fields, **statistics.as_dict()}))
@@ -13,7 +13,33 @@ def get_analysis(fen):
         depth = int(d)
     else:
         depth = 4
-    return jsonify(engine.get_value_and_best_move(game.Game(fen), depth)), 200
+    split = request.args.get("split") == "1"  # share root moves between the threads instead of lazy smp
+    try:
+        position = game.Game(fen)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    threads = request.args.get("threads")
+    if threads:
+        try:
+            threads = int(threads)
+        except ValueError:
+            return jsonify({"error": f"threads must be a whole number, not {threads}"}), 400
+        if not 1 <= threads <= engine.MAX_SEARCH_THREADS:
+            return jsonify({"error": f"threads must be between 1 and {engine.MAX_SEARCH_THREADS}"}), 400
+        if not split:
+            engine.set_search_threads(threads)  # waits for other requests' searches to finish first
+    else:
+        threads = None
+    try:
+        multi_pv = max(1, int(request.args.get("multipv", 1)))  # the best this many lines, after the value and move
+    except ValueError:
+        return jsonify({"error": f"multipv must be a whole number, not {request.args.get('multipv')}"}), 400
+    stats = request.args.get("stats") == "1"
+    result = engine.get_value_and_best_move(position, depth, threads, split, stats, multi_pv)
+    if stats:
+        result = result[:-1] + (result[-1].as_dict(),)
+    return jsonify(result), 200
 
 if __name__ == "__main__":
+    engine.set_search_threads(preferences[Prefs.ENGINE_THREADS])
     app.run(host="localhost", port=5000, debug=True)
\ No newline at end of file
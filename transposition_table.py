@@ -0,0 +1,165 @@
+"""Transposition tables for the engine's search
+one slot per zobrist key (modulo the table size), each holding the score of a searched node, the depth it was searched to,
+whether the score is exact or only a bound, the best move found and the search it came from
+TranspositionTable is a plain list for one process, SharedTranspositionTable lives in shared memory for lazy smp"""
+import sys
+from multiprocessing import shared_memory
+
+DEFAULT_MEGABYTES = 32
+# bound flags, see negamax for when each is stored
+EXACT = 0
+LOWER_BOUND = 1  # the node failed high, its score is at least this
+UPPER_BOUND = 2  # the node failed low, its score is at most this
+# list slot, tuple of six and a 64 bit key, the other fields are small ints python already has
+ENTRY_BYTES = 8 + sys.getsizeof((0, 0, 0, 0, 0, 0)) + sys.getsizeof(1 << 63)
+
+
+class TranspositionTable:
+    def __init__(self, megabytes: float = DEFAULT_MEGABYTES):
+        self.resize(megabytes)
+
+    def resize(self, megabytes: float):
+        """entries are indexed by the low bits of the key so the size is rounded down to a power of two"""
+        entries = max(1, int(megabytes * 1024 * 1024) // ENTRY_BYTES)
+        self.size = 1 << (entries.bit_length() - 1)
+        self.mask = self.size - 1
+        self.clear()
+
+    def clear(self):
+        self.entries: list[tuple[int, int, int, int, int | None, int] | None] = [None] * self.size  # (key, depth, flag, score, move, age)
+        self.age = 0
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    def new_search(self):
+        """entries from older searches are replaced first, but are still used until they are"""
+        self.age = (self.age + 1) & 0xFF
+
+    def probe(self, key: int) -> tuple[int, int, int, int | None] | None:
+        """return (depth, flag, score, move) stored for key, or None"""
+        self.probes += 1
+        entry = self.entries[key & self.mask]
+        if entry is None or entry[0] != key:
+            return None
+        self.hits += 1
+        return entry[1], entry[2], entry[3], entry[4]
+
+    def store(self, key: int, depth: int, flag: int, score: int, move: int | None):
+        """keep whichever entry is more useful, entries from this search are only replaced by ones at least as deep
+        or by the same position again, and a new result without a move keeps the old move"""
+        index = key & self.mask
+        entry = self.entries[index]
+        if entry is not None:
+            if entry[0] == key:
+                if move is None:
+                    move = entry[4]
+            elif entry[5] == self.age and entry[1] > depth:
+                return
+        self.entries[index] = (key, depth, flag, score, move, self.age)
+        self.stores += 1
+
+    def best_move(self, key: int) -> int | None:
+        entry = self.entries[key & self.mask]
+        if entry is None or entry[0] != key:
+            return None
+        return entry[4]
+
+    def usage(self) -> float:
+        """fraction of the first thousand slots filled in this search, like uci's hashfull but out of 1"""
+        sample = self.entries[:1000]
+        return sum(1 for entry in sample if entry is not None and entry[5] == self.age) / len(sample)
+
+
+# SharedTranspositionTable packs an entry into one 64 bit data word:
+# bits 0-19 move + 1 (0 for no move), 20-27 depth, 28-29 flag, 30-37 age, 38-61 score + SCORE_OFFSET
+SCORE_OFFSET = 1 << 23
+SHARED_ENTRY_BYTES = 16
+
+
+class SharedTranspositionTable:
+    """the same interface as TranspositionTable, but in shared memory so every lazy smp process searches with one table
+    there are no locks, each slot is the key xored with the data word followed by the data word, so a slot half written
+    by one process while another reads it just looks like a different key and is ignored
+    the process that creates the table owns it, others attach by name and only close it"""
+    def __init__(self, megabytes: float = DEFAULT_MEGABYTES, name: str | None = None):
+        self.owner = name is None
+        if self.owner:
+            entries = max(1, int(megabytes * 1024 * 1024) // SHARED_ENTRY_BYTES)
+            self.size = 1 << (entries.bit_length() - 1)
+            self.memory = shared_memory.SharedMemory(create=True, size=self.size * SHARED_ENTRY_BYTES)
+            self.memory.buf[:] = bytes(self.size * SHARED_ENTRY_BYTES)  # not guaranteed to start zeroed on every platform
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+            self.size = self.memory.size // SHARED_ENTRY_BYTES
+        self.name = self.memory.name
+        self.closed = False
+        self.megabytes = megabytes
+        self.words = self.memory.buf.cast("Q")
+        self.mask = self.size - 1
+        self.age = 0
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    def clear(self):
+        self.memory.buf[:] = bytes(self.size * SHARED_ENTRY_BYTES)
+        self.age = 0
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    def new_search(self):
+        self.age = (self.age + 1) & 0xFF
+
+    def read(self, key: int) -> int | None:
+        """the data word stored for key, or None"""
+        index = (key & self.mask) << 1
+        data = self.words[index + 1]
+        if self.words[index] ^ data != key or not data:
+            return None
+        return data
+
+    def probe(self, key: int) -> tuple[int, int, int, int | None] | None:
+        self.probes += 1
+        data = self.read(key)
+        if data is None:
+            return None
+        self.hits += 1
+        move = data & 0xFFFFF
+        return (data >> 20) & 0xFF, (data >> 28) & 0b11, (data >> 38) - SCORE_OFFSET, move - 1 if move else None
+
+    def store(self, key: int, depth: int, flag: int, score: int, move: int | None):
+        index = (key & self.mask) << 1
+        old_data = self.words[index + 1]
+        if old_data:
+            if self.words[index] ^ old_data == key:
+                if move is None and old_data & 0xFFFFF:
+                    move = (old_data & 0xFFFFF) - 1
+            elif (old_data >> 30) & 0xFF == self.age and (old_data >> 20) & 0xFF > depth:
+                return
+        data = ((move + 1 if move is not None else 0) | (min(depth, 0xFF) << 20) | (flag << 28) | (self.age << 30)
+                | ((score + SCORE_OFFSET) << 38))
+        self.words[index] = key ^ data
+        self.words[index + 1] = data
+        self.stores += 1
+
+    def best_move(self, key: int) -> int | None:
+        data = self.read(key)
+        if data is None or not data & 0xFFFFF:
+            return None
+        return (data & 0xFFFFF) - 1
+
+    def usage(self) -> float:
+        sample = min(1000, self.size)
+        return sum(1 for index in range(sample) if self.words[2 * index + 1] and (self.words[2 * index + 1] >> 30) & 0xFF == self.age) / sample
+
+    def close(self):
+        """stop using the table, and free it if this process made it"""
+        if self.closed:
+            return
+        self.closed = True
+        self.words.release()
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
@@ -0,0 +1,199 @@
+"""UCI front end, so the engine can be run by chess GUIs and testing tools like cutechess-cli
+reads commands on stdin and answers on stdout, searches run on a background thread so stop and isready are answered
+straight away
+
+python uci.py"""
+import sys
+import threading
+import engine
+from game import Game
+from utils_and_constants import *
+
+ENGINE_NAME = "new chess"
+ENGINE_AUTHOR = "new chess contributors"
+MAX_HASH_MEGABYTES = 1024
+MOVES_TO_GO = 30  # assumed moves left in the game when the gui doesn't say
+MOVE_OVERHEAD = 0.05  # seconds kept back for the gui and the pipe
+
+
+def time_limits(clock: float, increment: float, moves_to_go: int | None) -> tuple[float, float]:
+    """soft and hard time in seconds for one move, given the time and increment left on our clock"""
+    clock = max(0.0, clock - MOVE_OVERHEAD)
+    soft_time = clock / (moves_to_go or MOVES_TO_GO) + increment * 0.8
+    hard_time = min(soft_time * 3, clock / 4 + increment)
+    return min(soft_time, hard_time), hard_time
+
+def uci_score(value: int, white_move: bool, depth: int) -> str:
+    """value is white positive, uci scores are for the side to move and mates are counted in moves"""
+    score = value if white_move else -value
+    if abs(score) > engine.MATE_THRESHOLD:
+        plies = depth - (abs(score) - engine.MATE_SCORE)  # mate scores count the depth left when the king goes
+        moves = (plies + 1) // 2
+        return f"mate {moves if score > 0 else -moves}"
+    return f"cp {score}"
+
+
+class UCIEngine:
+    def __init__(self, output=sys.stdout):
+        self.output = output
+        self.output_lock = threading.Lock()  # info lines come from the search thread
+        self.game = Game()
+        self.position: tuple[str, list[str]] = (DEFAULT_FEN, [])  # the fen and moves last sent, see set_position
+        self.context: engine.SearchContext | None = None
+        self.search_thread: threading.Thread | None = None
+        self.infinite_done = threading.Event()  # an infinite search can't send bestmove until it's told to stop
+
+    def send(self, line: str):
+        with self.output_lock:
+            print(line, file=self.output, flush=True)
+
+    def handle(self, line: str) -> bool:
+        """run one command, returns False once told to quit"""
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, arguments = tokens[0], tokens[1:]
+        if command == "uci":
+            self.send(f"id name {ENGINE_NAME}")
+            self.send(f"id author {ENGINE_AUTHOR}")
+            self.send(f"option name Hash type spin default {engine.TRANSPOSITION_TABLE_MEGABYTES} min 1 max {MAX_HASH_MEGABYTES}")
+            self.send(f"option name Threads type spin default 1 min 1 max {engine.MAX_SEARCH_THREADS}")
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "setoption":
+            self.stop()
+            self.set_option(arguments)
+        elif command == "ucinewgame":
+            self.stop()
+            engine.transposition_table.clear()
+            self.set_position(DEFAULT_FEN, [])
+        elif command == "position":
+            self.stop()
+            self.position_command(arguments)
+        elif command == "go":
+            self.stop()
+            self.go(arguments)
+        elif command == "stop":
+            self.stop()
+        elif command == "quit":
+            self.stop()
+            return False
+        return True
+
+    def set_option(self, arguments: list[str]):
+        """setoption name <name> value <value>, names can have spaces in them"""
+        if "value" not in arguments:
+            return
+        name = " ".join(arguments[1:arguments.index("value")]).lower()
+        value = " ".join(arguments[arguments.index("value") + 1:])
+        try:
+            if name == "hash":
+                engine.set_transposition_table_megabytes(min(MAX_HASH_MEGABYTES, max(1, int(value))))
+            elif name == "threads":
+                engine.set_search_threads(int(value))
+        except ValueError:
+            self.send(f"info string invalid value {value} for {name}")
+
+    def position_command(self, arguments: list[str]):
+        moves = arguments[arguments.index("moves") + 1:] if "moves" in arguments else []
+        setup = arguments[:arguments.index("moves")] if "moves" in arguments else arguments
+        if setup[:1] == ["startpos"]:
+            fen = DEFAULT_FEN
+        elif setup[:1] == ["fen"]:
+            fen = " ".join(setup[1:])
+        else:
+            return
+        self.set_position(fen, moves)
+
+    def set_position(self, fen: str, moves: list[str]):
+        """guis send the whole game every move, so when it only adds moves to the last position just those are made
+        rather than parsing the fen and replaying the game again"""
+        old_fen, old_moves = self.position
+        if fen == old_fen and moves[:len(old_moves)] == old_moves:
+            new_moves = moves[len(old_moves):]
+        else:
+            try:
+                self.game = Game(fen)
+            except ValueError as e:
+                self.send(f"info string invalid fen: {e}")
+                return
+            new_moves = moves
+        self.position = (fen, moves)
+        for move_number, uci_move in enumerate(new_moves):
+            for move in self.game.generate_legal_moves():
+                if packed_move_to_uci(move) == uci_move:
+                    self.game.make_packed_move(move)
+                    break
+            else:
+                self.send(f"info string illegal move {uci_move}")
+                self.position = (fen, moves[:len(moves) - len(new_moves) + move_number])
+                return
+
+    def go(self, arguments: list[str]):
+        limits: dict[str, int] = {}
+        infinite = False
+        for index, token in enumerate(arguments):
+            if token in ("depth", "movetime", "nodes", "wtime", "btime", "winc", "binc", "movestogo") and index + 1 < len(arguments):
+                try:
+                    limits[token] = int(arguments[index + 1])
+                except ValueError:
+                    pass
+            elif token == "infinite":
+                infinite = True
+
+        soft_time = hard_time = None
+        if not infinite:
+            if "movetime" in limits:
+                soft_time = hard_time = max(0.0, limits["movetime"] / 1000 - MOVE_OVERHEAD)
+            elif ("wtime" if self.game.white_move else "btime") in limits:
+                white = self.game.white_move
+                soft_time, hard_time = time_limits(limits["wtime" if white else "btime"] / 1000, limits.get("winc" if white else "binc", 0) / 1000,
+                                                   limits.get("movestogo"))
+        self.infinite_done.clear()
+        self.context = engine.SearchContext()
+        self.search_thread = threading.Thread(target=self.search, args=(
+            self.game.copy(), self.context, limits.get("depth", engine.MAX_SEARCH_DEPTH), soft_time, hard_time, limits.get("nodes"), infinite), daemon=True)
+        self.search_thread.start()
+
+    def search(self, game: Game, context: engine.SearchContext, max_depth: int, soft_time: float | None, hard_time: float | None,
+               max_nodes: int | None, infinite: bool):
+        engine.transposition_table.new_search()
+        value, move, completed_depth, principal_variation = engine.lazy_smp_search(
+            game, context, max_depth=max_depth, soft_time=soft_time, hard_time=hard_time, max_nodes=max_nodes, on_iteration=self.send_info)
+        if infinite:
+            self.infinite_done.wait()  # uci says bestmove only comes after stop, even if the search has finished
+        if move is None:
+            self.send("bestmove 0000")
+        elif len(principal_variation) > 1 and principal_variation[0] == move:
+            self.send(f"bestmove {packed_move_to_uci(move)} ponder {packed_move_to_uci(principal_variation[1])}")
+        else:
+            self.send(f"bestmove {packed_move_to_uci(move)}")
+
+    def send_info(self, depth: int, value: int, move: int | None, principal_variation: list[int], context: engine.SearchContext):
+        statistics = context.statistics
+        self.send(f"info depth {depth} score {uci_score(value, self.game.white_move, depth)} nodes {context.nodes} "
+                  f"nps {statistics.nodes_per_second()} time {int(statistics.seconds() * 1000)} "
+                  f"hashfull {int(engine.transposition_table.usage() * 1000)} pv {' '.join(packed_move_to_uci(pv_move) for pv_move in principal_variation)}")
+
+    def stop(self):
+        """stop any search and wait for it to send bestmove, commands that change the position or the tables do this first"""
+        if self.context is not None:
+            self.context.stopped = True
+        self.infinite_done.set()
+        if self.search_thread is not None:
+            self.search_thread.join()
+            self.search_thread = None
+            self.context = None
+
+
+def main() -> int:
+    uci_engine = UCIEngine()
+    for line in sys.stdin:
+        if not uci_engine.handle(line):
+            break
+    uci_engine.stop()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -31,6 +31,8 @@ class Prefs:
     MINIMUM_ENGINE_TIME = 5
     PIECE_IMAGES = 6
     BOARD_IMAGE = 7
+    MAXIMUM_ENGINE_TIME = 8
+    ENGINE_THREADS = 9
 
 # DEFAULT_PREFERENCES = {
 #     Prefs.BACKGROUND_COLOUR: (64, 64, 64),
@@ -54,7 +56,9 @@ class Prefs:
 #         4: "images/bQ.svg",
 #         5: "images/bK.svg"
 #     },
-#     Prefs.BOARD_IMAGE: "images/board.png"
+#     Prefs.BOARD_IMAGE: "images/board.png",
+#     Prefs.MAXIMUM_ENGINE_TIME: 10,
+#     Prefs.ENGINE_THREADS: 1
 # }
 
 with open("default_preferences.pkl", "rb") as f:
@@ -62,6 +66,8 @@ with open("default_preferences.pkl", "rb") as f:
 
 with open("preferences.pkl", "rb") as f:
     preferences = pickle.load(f)
+for key, value in DEFAULT_PREFERENCES.items():
+    preferences.setdefault(key, value)  # preferences saved before a setting was added use its default
 
 def vector_add(t1: tuple, t2: tuple) -> tuple:
     """add two tuples together"""
@@ -94,3 +100,47 @@ def uci_to_pos_move(move: str) -> tuple[tuple[int, int], tuple[int, int]]:
 def notation_to_pos(notation: str) -> tuple[int, int]:
     """converts algebraic notation to coordinates"""
     return (ord(notation[0]) - 96, int(notation[1]))
+
+def pos_to_square(pos: tuple[int, int]) -> int:
+    """converts coordinates to a square number, a1 = 0, h1 = 7, a8 = 56"""
+    return (pos[1] - 1) * 8 + pos[0] - 1
+
+def square_to_pos(square: int) -> tuple[int, int]:
+    """converts a square number to coordinates"""
+    return (square % 8 + 1, square // 8 + 1)
+
+# Moves inside game and engine are packed into one int rather than a tuple of tuples:
+# bits 0-5 start square, bits 6-11 end square, bits 12-14 promotion piece type (0 for none) and flags above that
+MOVE_PROMOTION_SHIFT = 12
+MOVE_PROMOTION_MASK = 7 << MOVE_PROMOTION_SHIFT
+MOVE_CAPTURE = 1 << 15
+MOVE_CASTLE = 1 << 16
+MOVE_EN_PASSANT = 1 << 17
+MOVE_DOUBLE_PUSH = 1 << 18
+PROMOTION_LETTERS = {1: "n", 2: "b", 3: "r", 4: "q"}  # piece types from piece.py, which can't be imported here
+
+def encode_move(start_square: int, end_square: int, promotion_piece: int = 0, flags: int = 0) -> int:
+    """packs a move into an int"""
+    return start_square | (end_square << 6) | (promotion_piece << MOVE_PROMOTION_SHIFT) | flags
+
+def move_start_square(move: int) -> int:
+    return move & 0b111111
+
+def move_end_square(move: int) -> int:
+    return (move >> 6) & 0b111111
+
+def move_promotion_piece(move: int) -> int:
+    """promotion piece type, or 0 if the move isn't a promotion"""
+    return (move >> MOVE_PROMOTION_SHIFT) & 0b111
+
+def packed_move_to_pos_move(move: int) -> tuple[tuple[int, int], tuple[int, int]]:
+    """converts a packed move to coordinates, dropping the promotion piece"""
+    return (square_to_pos(move & 0b111111), square_to_pos((move >> 6) & 0b111111))
+
+def packed_move_to_uci(move: int) -> str:
+    """converts a packed move to UCI notation, including the promotion piece"""
+    uci = pos_move_to_uci(packed_move_to_pos_move(move))
+    promotion_piece = move_promotion_piece(move)
+    if promotion_piece:
+        uci += PROMOTION_LETTERS[promotion_piece]
+    return uci
@@ -0,0 +1,14 @@
+"""Random keys for zobrist hashing game.Game positions
+a position's key is the xor of the keys of everything in it, so make_move can update it by xoring keys in and out
+the seed is fixed so every process (and every run) agrees on the keys"""
+import random
+
+_random = random.Random(20240101)
+
+def _random_key() -> int:
+    return _random.getrandbits(64)
+
+PIECE_KEYS: list[list[int]] = [[_random_key() for _ in range(64)] for _ in range(16)]  # indexed by piece then square
+WHITE_TO_MOVE_KEY = _random_key()
+CASTLING_KEYS: list[int] = [_random_key() for _ in range(16)]  # indexed by the castling bits
+EN_PASSANT_KEYS: list[int] = [_random_key() for _ in range(64)]  # indexed by en passant square